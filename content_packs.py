@@ -0,0 +1,305 @@
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Curriculum content lives on disk as content packs:
+#
+#   <root>/manifest.json                  subject names and their directories
+#   <root>/<name>.json                    pack-wide data (levels, achievements, ...)
+#   <root>/<subject>/graph.json           learning path nodes
+#   <root>/<subject>/initial_test.json    placement test questions
+#   <root>/<subject>/questions/<key>.json question bank for a node (or level)
+#   <root>/<subject>/theory/<key>.md      theory text for a node
+#
+# Files are read on first access and then kept in a process-wide cache, so
+# every Streamlit session shares one copy and startup does not depend on the
+# size of the curriculum.
+#
+# A pack can also be compiled into <root>/pack.bundle: every file parsed
+# once and stored as a marshal blob, with an offset index at the end. The
+# bundle is memory-mapped, so a node is read without parsing anything else.
+# It records a fingerprint (path, size, mtime) and a content hash of its
+# sources; if the fingerprint no longer matches and the content hash does
+# not either, the bundle is rebuilt. If only the fingerprint is stale, the
+# bundle's index is rewritten with the new one, so the next start does not
+# hash every source file again.
+BUNDLE_NAME = "pack.bundle"
+BUNDLE_MAGIC = b"OZCB"
+BUNDLE_VERSION = 1
+# magic, format version, marshal version, index offset, index length
+BUNDLE_HEADER = struct.Struct("<4sHHQQ")
+
+_packs = {}
+_packs_lock = threading.Lock()
+
+
+class ContentPack:
+    """Lazily loaded, cached view of one content pack directory"""
+
+    def __init__(self, root, use_bundle=True):
+        self.root = root
+        self._cache = {}
+        self._lock = threading.Lock()
+        # None until first use, then the open Bundle or False
+        self._bundle = None if use_bundle else False
+
+    def _load(self, key, path, reader, default=None):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._cache:
+                if self._bundle is None:
+                    self._bundle = open_bundle(self.root) or False
+                if self._bundle:
+                    self._cache[key] = self._bundle.get(key, default)
+                else:
+                    full_path = os.path.join(self.root, path)
+                    if os.path.exists(full_path):
+                        with open(full_path, "r", encoding="utf-8") as file:
+                            self._cache[key] = reader(file)
+                    else:
+                        self._cache[key] = default
+            return self._cache[key]
+
+    def items(self):
+        """Yields (cache key, value) for every file in the pack"""
+        yield ("manifest",), self.manifest()
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(".json") and name != "manifest.json":
+                yield ("data", name[:-5]), self.data(name[:-5])
+        for subject in self.subjects():
+            yield ("graph", subject), self.graph(subject)
+            yield ("initial_test", subject), self.initial_test(subject)
+            for key in self.question_keys(subject):
+                yield ("questions", subject, key), self.questions(subject, key)
+            for key in self._keys(subject, "theory", ".md"):
+                yield ("theory", subject, key), self.theory(subject, key)
+
+    def _keys(self, subject, folder, suffix):
+        folder_path = os.path.join(self.root, self.subject_dir(subject), folder)
+        if not os.path.isdir(folder_path):
+            return []
+        return sorted(name[:-len(suffix)] for name in os.listdir(folder_path) if name.endswith(suffix))
+
+    def question_keys(self, subject):
+        """Returns the node (or level) keys that have a question bank"""
+        return self._keys(subject, "questions", ".json")
+
+    def manifest(self):
+        """Returns the pack manifest"""
+        return self._load(("manifest",), "manifest.json", json.load, {"subjects": []})
+
+    def subjects(self):
+        """Returns the subject names in display order"""
+        return [subject["name"] for subject in self.manifest()["subjects"]]
+
+    def subject_dir(self, subject):
+        """Returns the directory of a subject, relative to the pack root"""
+        for entry in self.manifest()["subjects"]:
+            if entry["name"] == subject:
+                return entry["path"]
+        raise KeyError(subject)
+
+    def data(self, name, default=None):
+        """Returns a pack-wide JSON file such as levels or achievements"""
+        return self._load(("data", name), f"{name}.json", json.load, default)
+
+    def graph(self, subject):
+        """Returns the learning path nodes for a subject"""
+        return self._load(("graph", subject), os.path.join(self.subject_dir(subject), "graph.json"), json.load, [])
+
+    def initial_test(self, subject):
+        """Returns the placement test questions for a subject"""
+        path = os.path.join(self.subject_dir(subject), "initial_test.json")
+        return self._load(("initial_test", subject), path, json.load, [])
+
+    def questions(self, subject, key):
+        """Returns the question bank for a node (or level) of a subject"""
+        path = os.path.join(self.subject_dir(subject), "questions", f"{key}.json")
+        return self._load(("questions", subject, key), path, json.load, [])
+
+    def theory(self, subject, key):
+        """Returns the theory markdown for a node, or None if there is none"""
+        path = os.path.join(self.subject_dir(subject), "theory", f"{key}.md")
+        return self._load(("theory", subject, key), path, lambda file: file.read(), None)
+
+
+def get_pack(root):
+    """Returns the shared ContentPack for a directory"""
+    root = os.path.abspath(root)
+    with _packs_lock:
+        if root not in _packs:
+            _packs[root] = ContentPack(root)
+        return _packs[root]
+
+
+class Bundle:
+    """Read-only, memory-mapped view of a compiled pack.bundle"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, marshal_version, index_offset, index_length = BUNDLE_HEADER.unpack_from(self._map)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION or marshal_version != marshal.version:
+            self._map.close()
+            raise ValueError(f"{path} is not a compatible content bundle")
+        index = marshal.loads(self._map[index_offset:index_offset + index_length])
+        self.fingerprint = index["fingerprint"]
+        self.content_hash = index["content_hash"]
+        self._entries = index["entries"]
+        self._index_offset = index_offset
+
+    def get(self, key, default=None):
+        """Unmarshals one entry straight from the mapped file"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        offset, length = entry
+        return marshal.loads(self._map[offset:offset + length])
+
+    def restamp(self, path, fingerprint):
+        """Writes a copy of the bundle with a new fingerprint to path; the entries are copied as they are"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        index = marshal.dumps({"fingerprint": fingerprint, "content_hash": self.content_hash, "entries": self._entries})
+        with open(temp_path, "wb") as file:
+            file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, marshal.version, self._index_offset, len(index)))
+            file.write(self._map[BUNDLE_HEADER.size:self._index_offset])
+            file.write(index)
+        os.replace(temp_path, path)
+        return path
+
+    def close(self):
+        self._map.close()
+
+
+def _source_files(root):
+    """Returns the pack's source files as sorted paths relative to root"""
+    files = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.endswith((".json", ".md")):
+                files.append(os.path.relpath(os.path.join(folder, name), root))
+    return sorted(files)
+
+
+def source_fingerprint(root):
+    """Cheap staleness check: hashes path, size and mtime of every source file"""
+    digest = hashlib.sha1()
+    for path in _source_files(root):
+        stat = os.stat(os.path.join(root, path))
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+
+def source_content_hash(root):
+    """Hashes the bytes of every source file, so touched-but-unchanged files do not count"""
+    digest = hashlib.sha1()
+    for path in _source_files(root):
+        digest.update(path.encode() + b"\0")
+        with open(os.path.join(root, path), "rb") as file:
+            digest.update(file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def build_bundle(root):
+    """Compiles every file of a pack into <root>/pack.bundle and returns its path"""
+    path = os.path.join(root, BUNDLE_NAME)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fingerprint = source_fingerprint(root)
+    content_hash = source_content_hash(root)
+    entries = {}
+    with open(temp_path, "wb") as file:
+        file.write(bytes(BUNDLE_HEADER.size))
+        for key, value in ContentPack(root, use_bundle=False).items():
+            blob = marshal.dumps(value)
+            entries[key] = (file.tell(), len(blob))
+            file.write(blob)
+        index = marshal.dumps({"fingerprint": fingerprint, "content_hash": content_hash, "entries": entries})
+        index_offset = file.tell()
+        file.write(index)
+        file.seek(0)
+        file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, marshal.version, index_offset, len(index)))
+    os.replace(temp_path, path)
+    return path
+
+
+def open_bundle(root, rebuild=True):
+    """Opens the pack's bundle, rebuilding it first if its sources changed.
+
+    Returns None if there is no usable bundle and it cannot be built (for
+    example on a read-only checkout); callers then read the files directly.
+    """
+    path = os.path.join(root, BUNDLE_NAME)
+    bundle = None
+    if os.path.exists(path):
+        try:
+            bundle = Bundle(path)
+        except (OSError, ValueError, EOFError, struct.error):
+            bundle = None
+    if bundle is not None:
+        fingerprint = source_fingerprint(root)
+        if bundle.fingerprint == fingerprint:
+            return bundle
+        if bundle.content_hash == source_content_hash(root):
+            # Files were touched but not changed: keep the entries, record the new fingerprint
+            if not rebuild:
+                return bundle
+            try:
+                restamped = Bundle(bundle.restamp(path, fingerprint))
+            except (OSError, ValueError, EOFError, struct.error):
+                return bundle
+            bundle.close()
+            return restamped
+        bundle.close()
+    if not rebuild:
+        return None
+    try:
+        return Bundle(build_bundle(root))
+    except OSError:
+        return None
+
+
+def benchmark(root, repeats=20):
+    """Times a cold load of the whole pack from the bundle and from the source files"""
+    build_bundle(root)
+    results = {}
+    for label, use_bundle in (("bundle", True), ("files", False)):
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            pack = ContentPack(root, use_bundle=use_bundle)
+            count = sum(1 for _ in pack.items())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+            if pack._bundle:
+                pack._bundle.close()
+        results[label] = {"entries": count, "best_ms": best * 1000}
+    return results
+
+
+def main(argv=None):
+    """Command line entry point: python content_packs.py build|bench [root]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile and benchmark content packs")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("root", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "content"))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"Wrote {build_bundle(args.root)}")
+    else:
+        for label, result in benchmark(args.root).items():
+            print(f"{label}: {result['entries']} entries, cold load {result['best_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+
+# Loader for the course export in oz_academy_manual/data_json.json. Its
+# quizzes, assignments and lessons are nested topic -> subtopic; they are
+# converted once into the runtime question and theory model and kept in a
+# process-wide cache. The file is re-read whenever its size or mtime changes,
+# so edits show up without restarting the app.
+#
+# Graph nodes pick up this content through an optional "topics" field, a
+# list of [topic, subtopic] pairs.
+
+_courses = {}
+_courses_lock = threading.Lock()
+
+
+def convert_quiz(quiz, topic):
+    """Converts a quiz entry, resolving correct_index to the option text"""
+    options = quiz["options"]
+    index = quiz["correct_index"]
+    if not 0 <= index < len(options):
+        raise ValueError(f"correct_index {index} out of range in {topic}: {quiz['question']!r}")
+    return {
+        "type": "single_choice",
+        "question": quiz["question"],
+        "options": options,
+        "correct": options[index],
+        "explanation": quiz.get("explanation", ""),
+        "topic": list(topic),
+    }
+
+
+def convert_assignment(assignment, topic):
+    """Converts an assignment into a code question whose tests are call expressions"""
+    return {
+        "type": "code",
+        "language": "python",
+        "question": f"{assignment['title']}: {assignment['description']}",
+        "starter_code": assignment.get("example", ""),
+        # Each test is a Python expression such as "calculator(5, 3, '+')"
+        # evaluated against the submission, not stdin for a script
+        "test_style": "call",
+        "test_cases": [{"input": test["input"], "expected": test["expected"]} for test in assignment.get("tests", [])],
+        "topic": list(topic),
+    }
+
+
+def convert_lessons(lessons):
+    """Renders the lessons of one subtopic as markdown"""
+    parts = []
+    for title, lesson in lessons.items():
+        parts.append(f"### {title}\n\n{lesson.get('content', '')}")
+        if lesson.get("code_example"):
+            parts.append(f"```python\n{lesson['code_example']}\n```")
+        if lesson.get("video_url"):
+            parts.append(f"[Video]({lesson['video_url']})")
+    return "\n\n".join(parts)
+
+
+def _nested(data, section):
+    for topic, subtopics in data.get(section, {}).items():
+        for subtopic, value in subtopics.items():
+            yield (topic, subtopic), value
+
+
+def convert(data):
+    """Builds {(topic, subtopic): [questions]} and {(topic, subtopic): markdown}"""
+    questions = {}
+    for topic, quizzes in _nested(data, "quizzes"):
+        questions.setdefault(topic, []).extend(convert_quiz(quiz, topic) for quiz in quizzes)
+    for topic, assignments in _nested(data, "assignments"):
+        questions.setdefault(topic, []).extend(convert_assignment(assignment, topic) for assignment in assignments)
+    theory = {topic: convert_lessons(lessons) for topic, lessons in _nested(data, "lessons_content")}
+    return questions, theory
+
+
+class CourseData:
+    """Converted view of a data_json.json file, reloaded when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.error = None
+        self._signature = None
+        self._questions = {}
+        self._theory = {}
+        self._synced = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reloads the file if it changed and returns the current version"""
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return self.version
+        with self._lock:
+            if signature != self._signature:
+                try:
+                    if signature is None:
+                        questions, theory = {}, {}
+                    else:
+                        with open(self.path, "r", encoding="utf-8") as file:
+                            questions, theory = convert(json.load(file))
+                except (ValueError, KeyError, TypeError) as e:
+                    # Keep serving the last good version while the file is broken
+                    self.error = f"{self.path}: {e}"
+                else:
+                    self._questions, self._theory = questions, theory
+                    self.error = None
+                    self.version += 1
+                self._signature = signature
+            return self.version
+
+    def questions(self, topic, subtopic):
+        """Returns the converted quizzes and assignments of a subtopic"""
+        self.refresh()
+        return self._questions.get((topic, subtopic), [])
+
+    def theory(self, topics):
+        """Returns the lesson markdown for a list of [topic, subtopic] pairs, or None"""
+        self.refresh()
+        parts = [self._theory[tuple(topic)] for topic in topics if tuple(topic) in self._theory]
+        return "\n\n".join(parts) if parts else None
+
+    def sync_index(self, index, pack):
+        """Files the questions of every graph node with "topics" into a QuestionIndex.
+
+        Only does work when the file has changed since the last sync.
+        """
+        version = self.refresh()
+        if self._synced.get(id(index)) == version:
+            return
+        with self._lock:
+            if self._synced.get(id(index)) == version:
+                return
+            index.remove_source(self.path)
+            for subject in pack.subjects():
+                for node in pack.graph(subject):
+                    for topic in node.get("topics", []):
+                        for question in self._questions.get(tuple(topic), []):
+                            index.add(dict(question), subject, node["id"], source=self.path, level=node.get("level"))
+            self._synced[id(index)] = version
+
+
+def get_course(path):
+    """Returns the shared CourseData for a file"""
+    path = os.path.abspath(path)
+    with _courses_lock:
+        if path not in _courses:
+            _courses[path] = CourseData(path)
+        return _courses[path]
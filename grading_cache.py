@@ -0,0 +1,224 @@
+import ast
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import tokenize
+from collections import OrderedDict
+
+import sandbox
+
+# Cache of graded code submissions. Learners resubmit the same code after a
+# failure, often with only whitespace or comments changed, and a whole class
+# tends to converge on the same solution. Results are keyed by the question
+# (its ID and its tests) and a hash of the submission's AST, so any of those
+# variants is answered without going to the sandbox. Results with an error
+# message carry the submission's line number ("Line 3: ..."), so they are
+# stored under a hash that also covers line positions instead.
+#
+# The memory tier is an LRU bounded by total result size. An optional SQLite
+# file behind it keeps results across restarts and is shared by every
+# process of the app.
+MEMORY_BYTES = 32 * 1024 * 1024
+DISK_PATH = os.path.join("user_data", "grading_cache.db")
+DISK_ENTRIES = 100000
+# Only deterministic outcomes are stored; timeouts and crashes may have been
+# caused by load on the machine rather than by the code
+CACHEABLE_STATUSES = {"ok", "error", "memory", "output_limit", "cancelled"}
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def submission_hash(code, lines=False):
+    """Hashes the code's AST, or its token stream if it does not parse.
+
+    Formatting and comments do not change the hash; renaming anything does.
+    With lines=True, moving code to other lines changes it too.
+    """
+    try:
+        tree = ast.parse(code)
+        normalised = ast.dump(tree, annotate_fields=False, include_attributes=False)
+        if lines:
+            normalised += "\0lines\0" + ",".join(str(node.lineno) for node in ast.walk(tree) if hasattr(node, "lineno"))
+    except (SyntaxError, ValueError):
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(code).readline)
+            normalised = "\0".join(f"{token.start[0]}:{token.string}" if lines else token.string for token in tokens
+                                   if token.type not in (tokenize.COMMENT, tokenize.NL))
+        except (tokenize.TokenError, SyntaxError):
+            normalised = "\n".join(line.rstrip() for line in (code.rstrip() if lines else code.strip()).splitlines())
+        normalised = ("lines\0tokens\0" if lines else "tokens\0") + normalised
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+
+def question_key(question):
+    """Identifies a question and the exact tests it is graded with"""
+    tests = json.dumps([question.get("test_style"), question.get("test_cases")], sort_keys=True, ensure_ascii=False)
+    return f"{question.get('id', '')}:{hashlib.sha256(tests.encode('utf-8')).hexdigest()[:16]}"
+
+
+class GradingCache:
+    """Test results by (question, submission hash): an LRU in memory, optionally backed by SQLite"""
+
+    def __init__(self, max_bytes=MEMORY_BYTES, path=None, disk_entries=DISK_ENTRIES):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.disk_entries = disk_entries
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def key(self, question, code, stop_on_failure=False, lines=False):
+        return f"{question_key(question)}:{int(bool(stop_on_failure))}:{submission_hash(code, lines)}"
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS grading_cache (
+                    key TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS grading_cache_used ON grading_cache (used_at)")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, payload):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.metrics["evictions"] += 1
+
+    def get(self, key, *alternatives):
+        """Returns the cached list of test results under the first key that has them, or None"""
+        keys = (key,) + alternatives
+        with self._lock:
+            for key in keys:
+                payload = self._items.get(key)
+                if payload is not None:
+                    self._items.move_to_end(key)
+                    self.metrics["memory_hits"] += 1
+                    return json.loads(payload)
+        if self.path is not None:
+            conn = self._connection()
+            for key in keys:
+                row = conn.execute("SELECT results FROM grading_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE grading_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+                    self._remember(key, row[0])
+                    with self._lock:
+                        self.metrics["disk_hits"] += 1
+                    return json.loads(row[0])
+        with self._lock:
+            self.metrics["misses"] += 1
+        return None
+
+    def put(self, key, results):
+        """Stores the test results of a submission if every outcome is deterministic"""
+        if any(result.get("status", "ok") not in CACHEABLE_STATUSES for result in results):
+            return False
+        payload = json.dumps(results, ensure_ascii=False)
+        self._remember(key, payload)
+        with self._lock:
+            self.metrics["stores"] += 1
+            self._puts += 1
+            prune = self._puts % 1000 == 0
+        if self.path is not None:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO grading_cache (key, results, used_at) VALUES (?, ?, ?)",
+                         (key, payload, time.time()))
+            if prune:
+                conn.execute("""
+                    DELETE FROM grading_cache WHERE used_at < (
+                        SELECT used_at FROM grading_cache ORDER BY used_at DESC LIMIT 1 OFFSET ?
+                    )
+                """, (self.disk_entries,))
+        return True
+
+    def stats(self):
+        """Returns the hit/miss counters, the hit rate and the memory tier's size"""
+        with self._lock:
+            stats = dict(self.metrics, entries=len(self._items), bytes=self._bytes)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+        if self.path is not None:
+            self._connection().execute("DELETE FROM grading_cache")
+
+
+def grade(question, code, stop_on_failure=False, cache=None, pool=None):
+    """sandbox.grade() with the cache in front: yields (index, test result).
+
+    A repeated submission yields its stored results at once; a new one is
+    run in the sandbox and stored once every case has finished.
+    """
+    cache = cache or get_cache()
+    key = cache.key(question, code, stop_on_failure)
+    lines_key = cache.key(question, code, stop_on_failure, lines=True)
+    results = cache.get(key, lines_key)
+    if results is not None:
+        for index, result in enumerate(results):
+            yield index, dict(result, cached=True)
+        return
+    results = [None] * len(question["test_cases"])
+    for index, result in sandbox.grade(question, code, pool, stop_on_failure):
+        results[index] = result
+        yield index, result
+    # Error messages name lines, so reuse them only for code laid out the same way
+    if any(result.get("error") for result in results):
+        key = lines_key
+    cache.put(key, results)
+
+
+def get_cache(path=DISK_PATH):
+    """Returns the shared GradingCache for a disk path (None for memory only)"""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = GradingCache(path=path)
+        return _caches[path]
+
+
+def main(argv=None):
+    """Command line entry point: python grading_cache.py stats|clear [path]"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "stats"
+    path = argv[1] if len(argv) > 1 else DISK_PATH
+    if command not in ("stats", "clear") or not os.path.exists(path):
+        print(main.__doc__ if command not in ("stats", "clear") else f"{path}: no cache yet", file=sys.stderr)
+        return 2
+    cache = GradingCache(path=path)
+    if command == "clear":
+        cache.clear()
+        return 0
+    conn = cache._connection()
+    count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(results)), 0) FROM grading_cache").fetchone()
+    print(f"{path}: {count} graded submissions, {size} bytes of results")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
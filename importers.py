@@ -0,0 +1,407 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Importers for question banks exported in other formats. Each one streams its
+# source line by line, so memory stays bounded by one question block no matter
+# how large the export is, and writes the app's question schema as JSONL.
+
+# Plain-text exam format (the `tests` file): question text, a "Варианты:"
+# marker, then one option per line. Blank lines are ignored, multi-line
+# question text (code listings) is kept, and "Вариант N" / "Вопрос:" headers
+# are skipped. The exports carry no answer key, so "correct" is None.
+OPTIONS_MARKER = re.compile(r"^\s*Варианты:\s*$")
+SECTION_HEADER = re.compile(r"^\s*(Вариант\s+\d+|Вопрос:)\s*$")
+OPTION_COUNT = 4
+
+# PDF exam papers: text is extracted page by page with pypdf (optional, only
+# needed for this importer) and cached under PDF_CACHE_DIR by a hash of the
+# page's raw content and the fonts it uses (their ToUnicode maps decide what
+# text CID-encoded glyphs become), so re-runs only extract pages that are new
+# or changed.
+# Two layouts are recognised: numbered questions with lettered options
+# ("1. ...", "A) ..."; a leading or trailing + or * marks the answer), and
+# <question>/<variant> markup, where the first variant is the answer.
+PDF_CACHE_DIR = os.path.join("user_data", "pdf_cache")
+PDF_QUESTION = re.compile(r"^\s*(?:<question>|(\d{1,3})\s*[.)])\s*(.*)$", re.IGNORECASE)
+PDF_OPTION = re.compile(r"^\s*(?:(<variant>)|([A-EА-Еa-eа-е])\s*[.)])\s*(.*)$", re.IGNORECASE)
+PDF_ANSWER_MARK = re.compile(r"^[+*]\s*|\s*[+*]$")
+
+
+class ImportIssue(Exception):
+    """A malformed block in an import source"""
+
+    def __init__(self, path, line, message):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+        self.message = message
+
+
+def block_id(question, options):
+    """Stable ID of a block: a hash of its normalised question text and options"""
+    payload = json.dumps([question, options], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _make_question(path, line, question_lines, options):
+    question = "\n".join(question_lines).strip()
+    return {
+        "id": block_id(question, options),
+        "type": "single_choice",
+        "question": question,
+        "options": options,
+        "correct": None,
+        "source": {"file": os.path.basename(path), "line": line},
+    }
+
+
+def parse_text_tests(path, option_count=OPTION_COUNT, errors=None):
+    """Yields questions from a plain-text exam export.
+
+    Malformed blocks are skipped; an ImportIssue for each is appended to
+    errors, or raised if no errors list is given.
+    """
+    def report(line, message):
+        issue = ImportIssue(path, line, message)
+        if errors is None:
+            raise issue
+        errors.append(issue)
+
+    question_lines, question_start = [], None
+    options, options_start, marker_line = None, None, None
+    with open(path, "r", encoding="utf-8") as file:
+        for number, raw in enumerate(file, 1):
+            line = raw.rstrip("\r\n")
+            if not line.strip():
+                continue
+
+            if OPTIONS_MARKER.match(line):
+                if options is not None:
+                    # A second marker before the options were complete: the
+                    # previous block was short and its "options" are really
+                    # the text of this question
+                    report(question_start, f"expected {option_count} options after line {marker_line}, found none before the next question")
+                    question_lines, question_start = options, options_start
+                if not question_lines:
+                    report(number, "options without a question")
+                options, options_start, marker_line = [], None, number
+                continue
+
+            if options is None:
+                if not question_lines and SECTION_HEADER.match(line):
+                    continue
+                if not question_lines:
+                    question_start = number
+                question_lines.append(line.rstrip())
+                continue
+
+            if not options:
+                options_start = number
+            options.append(line.strip())
+            if len(options) == option_count:
+                if question_lines:
+                    yield _make_question(path, question_start, question_lines, options)
+                question_lines, question_start = [], None
+                options, marker_line = None, None
+
+    if options is not None:
+        report(question_start or marker_line, f"expected {option_count} options after line {marker_line}, found {len(options)}")
+    elif question_lines:
+        report(question_start, "question without options")
+
+
+def _open_index():
+    """Returns a scratch SQLite database for record IDs, kept on disk rather than in memory"""
+    # "" is a private temporary file, deleted on close; only its page cache is held in memory
+    index = sqlite3.connect("")
+    # Nothing here needs to survive a crash
+    index.execute("PRAGMA journal_mode=OFF")
+    index.execute("PRAGMA synchronous=OFF")
+    index.execute("CREATE TABLE previous (id TEXT PRIMARY KEY, offset INTEGER, length INTEGER, source TEXT)")
+    index.execute("CREATE TABLE seen (id TEXT PRIMARY KEY)")
+    return index
+
+
+def _source_key(source):
+    return json.dumps(source, sort_keys=True, ensure_ascii=False)
+
+
+def _index_jsonl(path, index):
+    """Records ID -> (offset, length, source) of every record in an existing JSONL file; returns the count"""
+    count = 0
+    if not os.path.exists(path):
+        return count
+    with open(path, "rb") as file:
+        offset = 0
+        for raw in file:
+            if raw.strip():
+                record = json.loads(raw)
+                index.execute("INSERT OR REPLACE INTO previous VALUES (?, ?, ?, ?)",
+                              (record["id"], offset, len(raw), _source_key(record.get("source"))))
+                count += 1
+            offset += len(raw)
+    return count
+
+
+def write_jsonl(questions, output_path, incremental=False):
+    """Writes questions to JSONL and returns a summary.
+
+    In incremental mode, records whose ID and source location are already in
+    output_path are copied over byte for byte; new or edited blocks, and
+    blocks that moved in their source, are re-serialised. The IDs used for
+    that and for dropping duplicates live in a temporary SQLite file, so
+    memory does not grow with the size of the export.
+    """
+    index = _open_index()
+    summary = {"added": 0, "unchanged": 0, "duplicates": 0}
+    temp_path = f"{output_path}.tmp"
+    old_file = None
+    try:
+        if incremental and _index_jsonl(output_path, index):
+            old_file = open(output_path, "rb")
+        with open(temp_path, "wb") as output:
+            for question in questions:
+                qid = question["id"]
+                if index.execute("INSERT OR IGNORE INTO seen VALUES (?)", (qid,)).rowcount == 0:
+                    summary["duplicates"] += 1
+                    continue
+                row = index.execute("SELECT offset, length, source FROM previous WHERE id = ?", (qid,)).fetchone()
+                if row is not None:
+                    offset, length, source = row
+                    if source == _source_key(question.get("source")):
+                        old_file.seek(offset)
+                        output.write(old_file.read(length))
+                    else:
+                        output.write(json.dumps(question, ensure_ascii=False).encode("utf-8") + b"\n")
+                    summary["unchanged"] += 1
+                else:
+                    output.write(json.dumps(question, ensure_ascii=False).encode("utf-8") + b"\n")
+                    summary["added"] += 1
+        summary["removed"] = index.execute(
+            "SELECT COUNT(*) FROM previous WHERE id NOT IN (SELECT id FROM seen)"
+        ).fetchone()[0]
+    finally:
+        if old_file is not None:
+            old_file.close()
+        index.close()
+    os.replace(temp_path, output_path)
+    return summary
+
+
+def import_text_tests(path, output_path, incremental=False, option_count=OPTION_COUNT):
+    """Converts a plain-text export to JSONL and returns a summary"""
+    errors = []
+    summary = write_jsonl(parse_text_tests(path, option_count, errors), output_path, incremental)
+    summary["errors"] = errors
+    return summary
+
+
+def _require_pypdf():
+    try:
+        import pypdf
+    except ImportError:
+        raise ImportError("PDF import needs the pypdf package: pip install pypdf") from None
+    return pypdf
+
+
+def _hash_pdf_object(pypdf, value, digest, seen):
+    """Feeds a PDF object into digest, following references and including stream data"""
+    if isinstance(value, pypdf.generic.IndirectObject):
+        if value.idnum in seen:
+            digest.update(f"ref {value.idnum}\0".encode())
+            return
+        seen.add(value.idnum)
+        value = value.get_object()
+    if isinstance(value, pypdf.generic.StreamObject):
+        digest.update(b"stream\0" + value.get_data() + b"\0")
+    if isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(f"{key}\0".encode())
+            _hash_pdf_object(pypdf, value.raw_get(key), digest, seen)
+    elif isinstance(value, list):
+        for item in value:
+            _hash_pdf_object(pypdf, item, digest, seen)
+    elif not isinstance(value, pypdf.generic.StreamObject):
+        digest.update(f"{value!r}\0".encode())
+
+
+def _page_hashes(path):
+    """Hashes the raw content stream and the fonts of every page, without extracting text"""
+    pypdf = _require_pypdf()
+    hashes = []
+    font_hashes = {}
+    for page in pypdf.PdfReader(path).pages:
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+        digest = hashlib.sha1(data)
+        resources = page.get("/Resources")
+        fonts = resources.get_object().get("/Font") if resources is not None else None
+        if fonts is not None:
+            fonts = fonts.get_object()
+            for name in sorted(fonts):
+                # Pages usually share their fonts, so each one is hashed once per file
+                ref = fonts.raw_get(name)
+                key = ref.idnum if isinstance(ref, pypdf.generic.IndirectObject) else None
+                if key is None or key not in font_hashes:
+                    font_digest = hashlib.sha1()
+                    _hash_pdf_object(pypdf, ref, font_digest, set())
+                    if key is None:
+                        key = font_digest.hexdigest()
+                    font_hashes[key] = font_digest.hexdigest()
+                digest.update(f"\0font {name} {font_hashes[key]}".encode())
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def _extract_page(job):
+    path, number = job
+    pypdf = _require_pypdf()
+    return pypdf.PdfReader(path).pages[number].extract_text() or ""
+
+
+def extract_pdf_pages(paths, cache_dir=PDF_CACHE_DIR, workers=None):
+    """Returns {path: [page text, ...]}, extracting uncached pages in a process pool"""
+    os.makedirs(cache_dir, exist_ok=True)
+    pages = {path: _page_hashes(path) for path in paths}
+    texts = {path: [None] * len(hashes) for path, hashes in pages.items()}
+    jobs = []
+    for path, hashes in pages.items():
+        for number, page_hash in enumerate(hashes):
+            cache_path = os.path.join(cache_dir, f"{page_hash}.txt")
+            if os.path.exists(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as file:
+                    texts[path][number] = file.read()
+            else:
+                jobs.append((path, number))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for (path, number), text in zip(jobs, pool.map(_extract_page, jobs, chunksize=4)):
+                texts[path][number] = text
+                cache_path = os.path.join(cache_dir, f"{pages[path][number]}.txt")
+                with open(f"{cache_path}.tmp", "w", encoding="utf-8") as file:
+                    file.write(text)
+                os.replace(f"{cache_path}.tmp", cache_path)
+    return texts, len(jobs)
+
+
+def segment_pdf_text(path, pages, errors=None):
+    """Yields questions from the extracted pages of one PDF.
+
+    Questions may run across page breaks. Blocks with fewer than two options
+    are reported like parse_text_tests does, with the page they start on.
+    """
+    name = os.path.basename(path)
+    block = None
+
+    def finish():
+        if block is None:
+            return None
+        question = "\n".join(block["question"]).strip()
+        options = [" ".join(option).strip() for option in block["options"]]
+        correct = None
+        if block["first_is_answer"] and options:
+            correct = options[0]
+        for index, option in enumerate(options):
+            if PDF_ANSWER_MARK.search(option):
+                options[index] = PDF_ANSWER_MARK.sub("", option)
+                correct = options[index]
+        if len(options) < 2 or not question:
+            issue = ImportIssue(name, f"page {block['page']}", f"expected a question with options, found {len(options)} options")
+            if errors is None:
+                raise issue
+            errors.append(issue)
+            return None
+        return {
+            "id": block_id(question, options),
+            "type": "single_choice",
+            "question": question,
+            "options": options,
+            "correct": correct,
+            "source": {"file": name, "page": block["page"]},
+        }
+
+    for page_number, text in enumerate(pages, 1):
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            question_match = PDF_QUESTION.match(line)
+            option_match = PDF_OPTION.match(line)
+            if question_match and not (block and block["options"] and option_match):
+                question = finish()
+                if question:
+                    yield question
+                block = {"page": page_number, "question": [question_match.group(2)], "options": [], "first_is_answer": False}
+            elif option_match and block is not None:
+                block["options"].append([option_match.group(3)])
+                if option_match.group(1):
+                    block["first_is_answer"] = True
+            elif block is not None:
+                # Continuation of the last option, or of the question text
+                (block["options"][-1] if block["options"] else block["question"]).append(line.strip())
+    question = finish()
+    if question:
+        yield question
+
+
+def import_pdfs(paths, output_path, incremental=False, cache_dir=PDF_CACHE_DIR, workers=None):
+    """Converts PDF exam papers to JSONL and returns a summary"""
+    texts, extracted = extract_pdf_pages(paths, cache_dir, workers)
+    errors = []
+    questions = (question for path in paths for question in segment_pdf_text(path, texts[path], errors))
+    summary = write_jsonl(questions, output_path, incremental)
+    summary["errors"] = errors
+    summary["pages"] = sum(len(pages) for pages in texts.values())
+    summary["pages_extracted"] = extracted
+    return summary
+
+
+def iter_jsonl(path):
+    """Yields the records of an imported JSONL file"""
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    """Command line entry point: python importers.py tests|pdf [sources] [-o output] [--incremental]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import question banks into the app's JSONL schema")
+    commands = parser.add_subparsers(dest="command", required=True)
+    tests_parser = commands.add_parser("tests", help="import a plain-text exam export")
+    tests_parser.add_argument("source", nargs="?", default="tests")
+    tests_parser.add_argument("-o", "--output")
+    tests_parser.add_argument("--incremental", action="store_true", help="only re-ingest changed blocks")
+    tests_parser.add_argument("--options", type=int, default=OPTION_COUNT, help="options per question")
+    pdf_parser = commands.add_parser("pdf", help="import PDF exam papers")
+    pdf_parser.add_argument("sources", nargs="*")
+    pdf_parser.add_argument("-o", "--output", default="pdf_questions.jsonl")
+    pdf_parser.add_argument("--incremental", action="store_true", help="only re-ingest changed blocks")
+    pdf_parser.add_argument("--cache-dir", default=PDF_CACHE_DIR)
+    pdf_parser.add_argument("--workers", type=int, help="extraction processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if args.command == "tests":
+        output = args.output or f"{args.source}.jsonl"
+        summary = import_text_tests(args.source, output, args.incremental, args.options)
+    else:
+        output = args.output
+        sources = args.sources or sorted(name for name in os.listdir(".") if name.lower().endswith(".pdf"))
+        summary = import_pdfs(sources, output, args.incremental, args.cache_dir, args.workers)
+        print(f"{summary['pages']} pages, {summary['pages_extracted']} extracted, the rest from cache")
+    for issue in summary["errors"]:
+        print(issue, file=sys.stderr)
+    print(f"{output}: {summary['added']} added, {summary['unchanged']} unchanged, "
+          f"{summary['removed']} removed, {summary['duplicates']} duplicates, {len(summary['errors'])} malformed")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import threading
+
+# Index over the node list of a learning path. Pages look nodes up by ID and
+# ask for a node's prerequisites many times per render, so both are
+# precomputed once per subject instead of scanning the node list each time.
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+class LearningGraph:
+    """Node-by-ID map, predecessor lists and topological order of one graph"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.by_id = {node["id"]: node for node in nodes}
+        self.position = {node["id"]: index for index, node in enumerate(nodes)}
+        self.predecessors = {node["id"]: [] for node in nodes}
+        for node in nodes:
+            for target in node["connects_to"]:
+                if target in self.predecessors:
+                    self.predecessors[target].append(node["id"])
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        # Kahn's algorithm, taking ready nodes in file order; nodes on a cycle
+        # are appended at the end in file order
+        remaining = {node_id: len(preds) for node_id, preds in self.predecessors.items()}
+        ready = [node["id"] for node in self.nodes if remaining[node["id"]] == 0]
+        order = []
+        while ready:
+            next_ready = []
+            for node_id in ready:
+                order.append(node_id)
+                for target in self.by_id[node_id]["connects_to"]:
+                    if target in remaining:
+                        remaining[target] -= 1
+                        if remaining[target] == 0:
+                            next_ready.append(target)
+            ready = sorted(next_ready, key=self.position.__getitem__)
+        if len(order) < len(self.nodes):
+            placed = set(order)
+            order.extend(node["id"] for node in self.nodes if node["id"] not in placed)
+        return order
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.by_id
+
+    def get(self, node_id):
+        """Returns the node with this ID, or None"""
+        return self.by_id.get(node_id)
+
+    def is_unlocked(self, node_id, completed):
+        """Entry nodes are always unlocked, other nodes once any prerequisite is completed"""
+        predecessors = self.predecessors.get(node_id)
+        if predecessors is None:
+            return False
+        return not predecessors or any(other_id in completed for other_id in predecessors)
+
+    def statuses(self, completed, current=None):
+        """Returns {node id: "completed" | "active" | "unlocked" | "locked"} in one pass over the graph"""
+        if isinstance(completed, (list, tuple)):
+            completed = set(completed)
+        statuses = {}
+        for node in self.nodes:
+            node_id = node["id"]
+            if node_id in completed:
+                statuses[node_id] = "completed"
+            elif node_id == current:
+                statuses[node_id] = "active"
+            elif self.is_unlocked(node_id, completed):
+                statuses[node_id] = "unlocked"
+            else:
+                statuses[node_id] = "locked"
+        return statuses
+
+    def successors(self, node_id):
+        """Returns the nodes this node connects to"""
+        node = self.by_id.get(node_id)
+        return [self.by_id[target] for target in node["connects_to"] if target in self.by_id] if node else []
+
+
+def get_graph(pack, subject):
+    """Returns the shared LearningGraph for a subject of a content pack"""
+    key = (pack.root, subject)
+    try:
+        return _graphs[key]
+    except KeyError:
+        pass
+    with _graphs_lock:
+        if key not in _graphs:
+            _graphs[key] = LearningGraph(pack.graph(subject))
+        return _graphs[key]
@@ -0,0 +1,406 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+import learning_graph
+
+# Static layers of the learning maps. Node positions never change at runtime,
+# so everything that depends only on them is built once per subject and shared
+# by every session; a rerun only supplies the per-user node statuses.
+#
+# MapLayout (test.py): connector geometry is computed with NumPy over all
+# edges and the map is compiled into HTML fragments around the class
+# attributes.
+# PathLayout (new_steam_live.py): the SVG is built once with every element in
+# its locked colour, and a small <style> overlay recolours the rest.
+#
+# Maps with more than VIRTUALIZE_AFTER nodes are rendered one viewport at a
+# time: a uniform grid over the element bounding boxes finds what is visible,
+# and a minimap of at most MINIMAP_CELLS x MINIMAP_CELLS cells shows the rest,
+# so the payload stays bounded however large the curriculum grows.
+NODE_SIZE = 70
+CONNECTOR_HEIGHT = 4
+LOCKED_COLOR = "#4b4b4b"
+COMPLETED_EDGE_COLOR = "#58cc02"
+VIRTUALIZE_AFTER = 150
+VIEWPORT_WIDTH = 900
+VIEWPORT_HEIGHT = 700
+# Even a viewport over a dense cluster sends at most this many nodes
+MAX_VIEWPORT_NODES = 400
+GRID_CELL = 256
+MINIMAP_CELLS = 24
+MINIMAP_SIZE = 160
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def connector_geometry(positions, edges):
+    """Returns left, top, width and angle (degrees) of every connector, one array each"""
+    if not edges:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty
+    centers = np.asarray(positions, dtype=float) + NODE_SIZE / 2
+    edges = np.asarray(edges)
+    start = centers[edges[:, 0]]
+    end = centers[edges[:, 1]]
+    delta = end - start
+    angles = np.arctan2(delta[:, 1], delta[:, 0]) * 180 / np.pi
+    lengths = np.hypot(delta[:, 0], delta[:, 1])
+    lefts = np.minimum(start[:, 0], end[:, 0]) + np.abs(delta[:, 0]) / 2 - lengths / 2
+    tops = np.minimum(start[:, 1], end[:, 1]) + np.abs(delta[:, 1]) / 2 - CONNECTOR_HEIGHT / 2
+    return lefts, tops, lengths, angles
+
+
+class GridIndex:
+    """Uniform grid over bounding boxes (left, top, right, bottom) for rectangle queries"""
+
+    def __init__(self, boxes, cell_size=GRID_CELL):
+        self.boxes = boxes
+        self.cell_size = cell_size
+        self.cells = {}
+        for index, (left, top, right, bottom) in enumerate(boxes):
+            for cell in self._cells(left, top, right, bottom):
+                self.cells.setdefault(cell, []).append(index)
+
+    def _cells(self, left, top, right, bottom):
+        size = self.cell_size
+        for cell_x in range(int(left // size), int(right // size) + 1):
+            for cell_y in range(int(top // size), int(bottom // size) + 1):
+                yield cell_x, cell_y
+
+    def query(self, left, top, right, bottom):
+        """Returns the indices of boxes overlapping the rectangle, in ascending order"""
+        found = set()
+        for cell in self._cells(left, top, right, bottom):
+            found.update(self.cells.get(cell, ()))
+        boxes = self.boxes
+        return sorted(index for index in found
+                      if boxes[index][0] <= right and boxes[index][2] >= left
+                      and boxes[index][1] <= bottom and boxes[index][3] >= top)
+
+
+class _SpatialLayout:
+    """Bounds, grid indexes and minimap cells shared by both layouts"""
+
+    def _index(self, graph):
+        nodes = graph.nodes
+        self.node_ids = [node["id"] for node in nodes]
+        self.node_types = [node["type"] for node in nodes]
+        # (source index, target index) for every edge whose target exists
+        self.edges = [(graph.position[node["id"]], graph.position[target])
+                      for node in nodes for target in node["connects_to"] if target in graph.by_id]
+        positions = [node["position"] for node in nodes]
+        node_boxes = [(x, y, x + NODE_SIZE, y + NODE_SIZE) for x, y in positions]
+        half = NODE_SIZE / 2
+        edge_boxes = []
+        for source, target in self.edges:
+            (x1, y1), (x2, y2) = positions[source], positions[target]
+            edge_boxes.append((min(x1, x2) + half - 4, min(y1, y2) + half - 4,
+                               max(x1, x2) + half + 4, max(y1, y2) + half + 4))
+        self.width = max((box[2] for box in node_boxes), default=0) + 30
+        self.height = max((box[3] for box in node_boxes), default=0) + 30
+        self.virtualized = len(nodes) > VIRTUALIZE_AFTER
+        if self.virtualized:
+            self.node_grid = GridIndex(node_boxes)
+            self.edge_grid = GridIndex(edge_boxes)
+            # Minimap: nodes bucketed into at most MINIMAP_CELLS per side
+            self.minimap_cell = max(self.width, self.height) / MINIMAP_CELLS
+            cells = {}
+            for index, (x, y) in enumerate(positions):
+                cells.setdefault((int(x // self.minimap_cell), int(y // self.minimap_cell)), []).append(index)
+            self.minimap_cells = cells
+
+    def clamp_viewport(self, left, top, width=VIEWPORT_WIDTH, height=VIEWPORT_HEIGHT):
+        """Returns (left, top, width, height) moved inside the map"""
+        left = max(0, min(left, self.width - width))
+        top = max(0, min(top, self.height - height))
+        return int(left), int(top), width, height
+
+    def viewport_around(self, node_id, width=VIEWPORT_WIDTH, height=VIEWPORT_HEIGHT):
+        """Returns a viewport centred on a node (the map origin if it is unknown)"""
+        try:
+            index = self.node_ids.index(node_id)
+        except ValueError:
+            return self.clamp_viewport(0, 0, width, height)
+        x, y = self.positions[index]
+        return self.clamp_viewport(x + NODE_SIZE / 2 - width / 2, y + NODE_SIZE / 2 - height / 2, width, height)
+
+    def visible(self, viewport):
+        """Returns (edge indices, node indices) to draw for a viewport, or everything for None"""
+        if viewport is None:
+            return range(len(self.edges)), range(len(self.node_ids))
+        left, top, width, height = viewport
+        nodes = self.node_grid.query(left, top, left + width, top + height)[:MAX_VIEWPORT_NODES]
+        return self.edge_grid.query(left, top, left + width, top + height), nodes
+
+    def minimap(self, statuses, viewport):
+        """Returns an SVG overview: one square per occupied cell, shaded by how much of it is completed"""
+        scale = MINIMAP_SIZE / max(self.width, self.height)
+        size = self.minimap_cell * scale
+        parts = [f'<svg width="{MINIMAP_SIZE}" height="{MINIMAP_SIZE}" xmlns="http://www.w3.org/2000/svg">'
+                 f'<rect width="{MINIMAP_SIZE}" height="{MINIMAP_SIZE}" fill="#1b2733"/>']
+        for (cell_x, cell_y), members in self.minimap_cells.items():
+            done = sum(1 for index in members if statuses[self.node_ids[index]] == "completed")
+            color = COMPLETED_EDGE_COLOR if done == len(members) else "#76d639" if done else LOCKED_COLOR
+            parts.append(f'<rect x="{cell_x * size:.1f}" y="{cell_y * size:.1f}" '
+                         f'width="{size:.1f}" height="{size:.1f}" fill="{color}"/>')
+        if viewport is not None:
+            left, top, width, height = viewport
+            parts.append(f'<rect x="{left * scale:.1f}" y="{top * scale:.1f}" width="{width * scale:.1f}" '
+                         f'height="{height * scale:.1f}" fill="none" stroke="white" stroke-width="2"/>')
+        parts.append("</svg>")
+        return "".join(parts)
+
+
+class MapLayout(_SpatialLayout):
+    """Precompiled HTML for one subject's learning map"""
+
+    CONNECTOR_HEAD = '\n                <div\n                    class="'
+    NODE_HEAD = '\n        <div\n            class="'
+
+    def __init__(self, graph, subject):
+        nodes = graph.nodes
+        self._index(graph)
+        self.positions = [node["position"] for node in nodes]
+        self.node_classes = ["learning-node special-node" if node["type"] == "special" else "learning-node"
+                             for node in nodes]
+        lefts, tops, lengths, angles = connector_geometry(self.positions, self.edges)
+
+        # Each element is HEAD + class + tail; only the class changes per rerun
+        self.connector_tails = [f""""
+                    style="
+                        left: {left}px;
+                        top: {top}px;
+                        width: {length}px;
+                        height: {CONNECTOR_HEIGHT}px;
+                        transform: rotate({angle}deg);
+                        transform-origin: center;
+                    "
+                ></div>
+                """ for left, top, length, angle in zip(lefts.tolist(), tops.tolist(), lengths.tolist(), angles.tolist())]
+        self.node_tails = [f""""
+            style="left: {node['position'][0]}px; top: {node['position'][1]}px;"
+            onclick="window.location.href='?page=node&subject={subject}&node={node['id']}'"
+            title="{node['name']}"
+        >
+            <div class="node-icon">{node['icon']}</div>
+        </div>
+        """ for node in nodes]
+
+    def render(self, statuses, viewport=None):
+        """Fills in the status classes; statuses is LearningGraph.statuses() output.
+
+        With a viewport (left, top, width, height) only the elements inside it
+        are emitted, shifted so the viewport's corner is the map origin.
+        """
+        edges, nodes = self.visible(viewport)
+        node_ids = self.node_ids
+        html = []
+        # A connector is drawn as completed when its source node is
+        for index in edges:
+            completed = statuses[node_ids[self.edges[index][0]]] == "completed"
+            html += (self.CONNECTOR_HEAD, "node-connector completed" if completed else "node-connector",
+                     self.connector_tails[index])
+        for index in nodes:
+            status = statuses[node_ids[index]]
+            node_class = self.node_classes[index]
+            html += (self.NODE_HEAD, node_class if status == "unlocked" else f"{node_class} {status}",
+                     self.node_tails[index])
+        if viewport is None:
+            return "".join(html)
+        left, top, _, _ = viewport
+        return f'<div style="position: absolute; left: {-left}px; top: {-top}px;">{"".join(html)}</div>'
+
+
+class PathLayout(_SpatialLayout):
+    """Memoised SVG for one subject's learning path, recoloured by a CSS overlay"""
+
+    def __init__(self, graph, subject):
+        nodes = graph.nodes
+        self._index(graph)
+        self.positions = [node["position"] for node in nodes]
+        # Every subject tab is on the same page, so rules are scoped by SVG id
+        self.scope = "lp-" + (re.sub(r"[^a-z0-9]+", "-", subject.lower()).strip("-") or "path")
+        width = max(node["position"][0] for node in nodes) + 100 if nodes else 100
+        height = max(node["position"][1] for node in nodes) + 100 if nodes else 100
+        self.svg_open = f'<svg id="{self.scope}" width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">'
+        self.line_svgs = []
+        for index, (source, target) in enumerate(self.edges):
+            from_x, from_y = self.positions[source]
+            to_x, to_y = self.positions[target]
+            self.line_svgs.append(f'<line class="e{index}" x1="{from_x + 35}" y1="{from_y + 35}" '
+                                  f'x2="{to_x + 35}" y2="{to_y + 35}"/>')
+        self.node_svgs = [f'<circle class="n{index}" cx="{x + 35}" cy="{y + 35}" r="35"/>'
+                          f'<text x="{x + 35}" y="{y + 45}" fill="white">{node["icon"]}</text>'
+                          for index, (node, (x, y)) in enumerate(zip(nodes, self.positions))]
+        self.svg = self._svg(self.svg_open, self.line_svgs, self.node_svgs)
+
+    @staticmethod
+    def _svg(opening, lines, circles):
+        # Connections first, so they are drawn behind the nodes; shared
+        # attributes sit on the enclosing groups to keep the payload small
+        return (f'{opening}<g stroke="{LOCKED_COLOR}" stroke-width="8">{"".join(lines)}</g>'
+                f'<g fill="{LOCKED_COLOR}" font-size="24" text-anchor="middle">{"".join(circles)}</g></svg>')
+
+    def overlay(self, statuses, node_color, edges=None, nodes=None):
+        """Returns a <style> block colouring nodes and completed edges.
+
+        node_color(status, node_type) maps a LearningGraph.statuses() value to
+        a fill colour; nodes that stay LOCKED_COLOR need no rule.
+        """
+        if edges is None:
+            edges, nodes = range(len(self.edges)), range(len(self.node_ids))
+        fills = {}
+        colors = {}
+        for index in nodes:
+            key = (statuses[self.node_ids[index]], self.node_types[index])
+            color = colors.get(key)
+            if color is None:
+                color = colors[key] = node_color(*key)
+            if color != LOCKED_COLOR:
+                fills.setdefault(color, []).append(f"#{self.scope} .n{index}")
+        completed = [f"#{self.scope} .e{index}" for index in edges
+                     if statuses[self.node_ids[self.edges[index][0]]] == "completed"
+                     and statuses[self.node_ids[self.edges[index][1]]] == "completed"]
+        rules = [f"{','.join(selectors)}{{fill:{color}}}" for color, selectors in fills.items()]
+        if completed:
+            rules.append(f"{','.join(completed)}{{stroke:{COMPLETED_EDGE_COLOR}}}")
+        return f"<style>{''.join(rules)}</style>"
+
+    def render(self, statuses, node_color, viewport=None):
+        """Returns overlay plus SVG; with a viewport only the visible part is drawn"""
+        if viewport is None:
+            return self.overlay(statuses, node_color) + self.svg
+        edges, nodes = self.visible(viewport)
+        left, top, width, height = viewport
+        opening = (f'<svg id="{self.scope}" width="{width}" height="{height}" '
+                   f'viewBox="{left} {top} {width} {height}" xmlns="http://www.w3.org/2000/svg">')
+        svg = self._svg(opening, [self.line_svgs[index] for index in edges], [self.node_svgs[index] for index in nodes])
+        return self.overlay(statuses, node_color, edges, nodes) + svg
+
+
+def _get(kind, cls, pack, subject):
+    key = (kind, pack.root, subject)
+    try:
+        return _layouts[key]
+    except KeyError:
+        pass
+    with _layouts_lock:
+        if key not in _layouts:
+            _layouts[key] = cls(learning_graph.get_graph(pack, subject), subject)
+        return _layouts[key]
+
+
+def get_layout(pack, subject):
+    """Returns the shared MapLayout for a subject of a content pack"""
+    return _get("map", MapLayout, pack, subject)
+
+
+def get_path_layout(pack, subject):
+    """Returns the shared PathLayout for a subject of a content pack"""
+    return _get("path", PathLayout, pack, subject)
+
+
+def render_inline_svg(graph, statuses, node_color):
+    """The per-rerun SVG builder PathLayout replaced, kept for benchmark()"""
+    nodes = graph.nodes
+    max_x = max([node["position"][0] for node in nodes]) + 100
+    max_y = max([node["position"][1] for node in nodes]) + 100
+    svg = f'<svg width="{max_x}" height="{max_y}" xmlns="http://www.w3.org/2000/svg">'
+    for node in nodes:
+        from_x, from_y = node["position"]
+        for target_id in node["connects_to"]:
+            target_node = graph.get(target_id)
+            if target_node:
+                to_x, to_y = target_node["position"]
+                completed = statuses[node["id"]] == "completed" and statuses[target_id] == "completed"
+                color = COMPLETED_EDGE_COLOR if completed else LOCKED_COLOR
+                svg += f'<line x1="{from_x + 35}" y1="{from_y + 35}" x2="{to_x + 35}" y2="{to_y + 35}" stroke="{color}" stroke-width="8" />'
+    for node in nodes:
+        x, y = node["position"]
+        svg += f'''
+        <g transform="translate({x}, {y})">
+            <circle cx="35" cy="35" r="35" fill="{node_color(statuses[node["id"]], node["type"])}" />
+            <text x="35" y="45" text-anchor="middle" fill="white" font-size="24">{node["icon"]}</text>
+        </g>
+        '''
+    return svg + '</svg>'
+
+
+def _demo_color(status, node_type):
+    return {"completed": "#58cc02", "unlocked": "#76d639"}.get(status, LOCKED_COLOR)
+
+
+def synthetic_graph(count):
+    """A wide, branching graph of count nodes for benchmarks"""
+    nodes = []
+    for index in range(count):
+        targets = [f"node{index + step}" for step in (1, 2) if index + step < count]
+        nodes.append({"id": f"node{index}", "position": [(index % 12) * 110, (index // 12) * 110],
+                      "type": "special" if index % 7 == 0 else "normal", "icon": "⭐",
+                      "connects_to": targets, "name": f"Node {index}"})
+    return learning_graph.LearningGraph(nodes)
+
+
+def benchmark(graphs, repeats=50):
+    """Times one dashboard rerun (all graphs) with the inline builder, PathLayout and a viewport"""
+    prepared = []
+    for graph in graphs:
+        completed = [node["id"] for node in graph.nodes[:len(graph.nodes) // 3]]
+        prepared.append((graph, graph.statuses(completed)))
+
+    def run(render):
+        best, size = None, 0
+        for _ in range(repeats):
+            started = time.perf_counter()
+            size = sum(len(render(graph, statuses).encode("utf-8")) for graph, statuses in prepared)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return {"ms": best * 1000, "bytes": size}
+
+    layouts = {id(graph): PathLayout(graph, f"bench {index}") for index, (graph, _) in enumerate(prepared)}
+
+    def viewport(graph, statuses):
+        # Small graphs are drawn whole; large ones one screen plus the minimap
+        layout = layouts[id(graph)]
+        if not layout.virtualized:
+            return layout.render(statuses, _demo_color)
+        window = layout.viewport_around(graph.nodes[len(graph.nodes) // 2]["id"])
+        return layout.render(statuses, _demo_color, window) + layout.minimap(statuses, window)
+
+    return {
+        "inline": run(lambda graph, statuses: render_inline_svg(graph, statuses, _demo_color)),
+        "cached": run(lambda graph, statuses: layouts[id(graph)].render(statuses, _demo_color)),
+        "viewport": run(viewport),
+    }
+
+
+def main(argv=None):
+    """Command line entry point: python learning_map.py bench [--nodes N]"""
+    import argparse
+    import os
+
+    import content_packs
+
+    parser = argparse.ArgumentParser(description="Benchmark learning path rendering")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--nodes", type=int, action="append", help="also time a synthetic graph of N nodes")
+    args = parser.parse_args(argv)
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oz_academy_manual", "content")
+    pack = content_packs.get_pack(root)
+    cases = [("dashboard (all subjects)", [learning_graph.get_graph(pack, subject) for subject in pack.subjects()])]
+    for count in args.nodes or [500]:
+        cases.append((f"synthetic {count} nodes", [synthetic_graph(count)]))
+    for label, graphs in cases:
+        result = benchmark(graphs)
+        print(f"{label}: inline {result['inline']['ms']:.3f} ms / {result['inline']['bytes']} bytes, "
+              f"cached {result['cached']['ms']:.3f} ms / {result['cached']['bytes']} bytes, "
+              f"viewport {result['viewport']['ms']:.3f} ms / {result['viewport']['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,13 @@ import os
 from PIL import Image
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
+
+# Shared modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import content_packs
+import learning_graph
+import learning_map
 
 # Set page configuration
 st.set_page_config(
@@ -247,200 +254,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Sample data structures
-# In a real app, you would store this in a database
-SUBJECTS = ["Mathematics", "Science", "English", "History"]
-
-# Node connections define the learning path
-NODE_CONNECTIONS = {
-    "Mathematics": [
-        {"id": "node1", "position": (150, 100), "type": "normal", "icon": "📐", "connects_to": ["node2", "node3"], "level": "beginner"},
-        {"id": "node2", "position": (100, 200), "type": "normal", "icon": "➕", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node3", "position": (200, 200), "type": "normal", "icon": "✖️", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node4", "position": (150, 300), "type": "special", "icon": "🏆", "connects_to": ["node5", "node6"], "level": "beginner"},
-        {"id": "node5", "position": (75, 400), "type": "normal", "icon": "📊", "connects_to": ["node7"], "level": "intermediate"},
-        {"id": "node6", "position": (225, 400), "type": "normal", "icon": "📏", "connects_to": ["node7"], "level": "intermediate"},
-        {"id": "node7", "position": (150, 500), "type": "special", "icon": "🎯", "connects_to": [], "level": "advanced"}
-    ],
-    "Science": [
-        {"id": "node1", "position": (150, 100), "type": "normal", "icon": "🔬", "connects_to": ["node2", "node3"], "level": "beginner"},
-        {"id": "node2", "position": (75, 200), "type": "normal", "icon": "🧪", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node3", "position": (225, 200), "type": "normal", "icon": "🌡️", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node4", "position": (150, 300), "type": "special", "icon": "⚗️", "connects_to": [], "level": "intermediate"}
-    ],
-    "English": [
-        {"id": "node1", "position": (150, 100), "type": "normal", "icon": "📝", "connects_to": ["node2"], "level": "beginner"},
-        {"id": "node2", "position": (150, 200), "type": "normal", "icon": "📖", "connects_to": ["node3"], "level": "beginner"},
-        {"id": "node3", "position": (150, 300), "type": "special", "icon": "🏆", "connects_to": [], "level": "intermediate"}
-    ],
-    "History": [
-        {"id": "node1", "position": (150, 100), "type": "normal", "icon": "🏛️", "connects_to": ["node2", "node3"], "level": "beginner"},
-        {"id": "node2", "position": (100, 200), "type": "normal", "icon": "📜", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node3", "position": (200, 200), "type": "normal", "icon": "⚔️", "connects_to": ["node4"], "level": "beginner"},
-        {"id": "node4", "position": (150, 300), "type": "special", "icon": "🌍", "connects_to": [], "level": "intermediate"}
-    ]
-}
-
-QUESTIONS = {
-    "Mathematics": {
-        "beginner": [
-            {
-                "question": "What is 5 + 7?",
-                "options": ["10", "12", "13", "15"],
-                "correct": "12",
-                "explanation": "Adding 5 and 7 gives us 12."
-            },
-            {
-                "question": "Solve: 8 × 4",
-                "options": ["24", "32", "28", "36"],
-                "correct": "32",
-                "explanation": "Multiplying 8 by 4 gives us 32."
-            },
-            {
-                "question": "What is 20 ÷ 5?",
-                "options": ["4", "5", "3", "2"],
-                "correct": "4",
-                "explanation": "Dividing 20 by 5 gives us 4."
-            }
-        ],
-        "intermediate": [
-            {
-                "question": "Solve for x: 3x + 5 = 17",
-                "options": ["x = 4", "x = 6", "x = 12", "x = 3"],
-                "correct": "x = 4",
-                "explanation": "3x + 5 = 17\n3x = 12\nx = 4"
-            },
-            {
-                "question": "What is the area of a rectangle with length 8 cm and width 5 cm?",
-                "options": ["13 cm²", "26 cm²", "40 cm²", "30 cm²"],
-                "correct": "40 cm²",
-                "explanation": "Area = length × width = 8 × 5 = 40 cm²"
-            }
-        ],
-        "advanced": [
-            {
-                "question": "Find the derivative of f(x) = x³ + 2x² - x + 3",
-                "options": ["f'(x) = 3x² + 4x - 1", "f'(x) = 3x² + 2x - 1", "f'(x) = 2x² + 4x - 1", "f'(x) = 3x² + 4x + 1"],
-                "correct": "f'(x) = 3x² + 4x - 1",
-                "explanation": "Taking the derivative term by term:\nf(x) = x³ + 2x² - x + 3\nf'(x) = 3x² + 4x - 1"
-            }
-        ]
-    },
-    "Science": {
-        "beginner": [
-            {
-                "question": "Which of the following is NOT a state of matter?",
-                "options": ["Solid", "Liquid", "Gas", "Energy"],
-                "correct": "Energy",
-                "explanation": "The three common states of matter are solid, liquid, and gas. Energy is a form of power, not a state of matter."
-            },
-            {
-                "question": "What is the chemical symbol for water?",
-                "options": ["H₂O", "CO₂", "O₂", "NaCl"],
-                "correct": "H₂O",
-                "explanation": "Water consists of two hydrogen atoms and one oxygen atom, represented as H₂O."
-            }
-        ],
-        "intermediate": [
-            {
-                "question": "Which of these is NOT a part of a plant cell?",
-                "options": ["Cell wall", "Chloroplast", "Cilium", "Mitochondria"],
-                "correct": "Cilium",
-                "explanation": "Cilia are found in certain animal cells but not in plant cells."
-            }
-        ],
-        "advanced": [
-            {
-                "question": "What is the approximate speed of light in a vacuum?",
-                "options": ["300,000 km/s", "200,000 km/s", "150,000 km/s", "350,000 km/s"],
-                "correct": "300,000 km/s",
-                "explanation": "The speed of light in a vacuum is approximately 299,792 kilometers per second, often rounded to 300,000 km/s."
-            }
-        ]
-    },
-    "English": {
-        "beginner": [
-            {
-                "question": "Which of the following is a proper noun?",
-                "options": ["London", "city", "dog", "beautiful"],
-                "correct": "London",
-                "explanation": "London is a proper noun because it names a specific city."
-            }
-        ],
-        "intermediate": [
-            {
-                "question": "Identify the correct sentence:",
-                "options": [
-                    "She don't like ice cream.",
-                    "She doesn't likes ice cream.",
-                    "She doesn't like ice cream.",
-                    "She not like ice cream."
-                ],
-                "correct": "She doesn't like ice cream.",
-                "explanation": "The correct form of the negative present simple for third person singular is 'doesn't like'."
-            }
-        ],
-        "advanced": [
-            {
-                "question": "Which literary device is used in: 'The wind whispered through the trees'?",
-                "options": ["Personification", "Metaphor", "Simile", "Hyperbole"],
-                "correct": "Personification",
-                "explanation": "Personification attributes human qualities (in this case, the ability to whisper) to non-human things (the wind)."
-            }
-        ]
-    },
-    "History": {
-        "beginner": [
-            {
-                "question": "Who was the first President of the United States?",
-                "options": ["Thomas Jefferson", "George Washington", "Abraham Lincoln", "John Adams"],
-                "correct": "George Washington",
-                "explanation": "George Washington was the first President of the United States, serving from 1789 to 1797."
-            }
-        ],
-        "intermediate": [
-            {
-                "question": "Which event marked the beginning of World War II in Europe?",
-                "options": [
-                    "The bombing of Pearl Harbor",
-                    "Germany's invasion of Poland",
-                    "The Russian Revolution",
-                    "The Treaty of Versailles"
-                ],
-                "correct": "Germany's invasion of Poland",
-                "explanation": "World War II in Europe began when Nazi Germany invaded Poland on September 1, 1939."
-            }
-        ],
-        "advanced": [
-            {
-                "question": "What was the significance of the Magna Carta?",
-                "options": [
-                    "It ended the Cold War",
-                    "It established colonies in America",
-                    "It limited the power of the English monarchy",
-                    "It created the United Nations"
-                ],
-                "correct": "It limited the power of the English monarchy",
-                "explanation": "Signed in 1215, the Magna Carta was a charter that limited the power of the English monarchy and established that everyone, including the king, was subject to the law."
-            }
-        ]
-    }
-}
+# Curriculum content (learning paths, question banks, levels and achievements)
+# is loaded from the content pack on first use and shared across sessions
+CONTENT = content_packs.get_pack(os.path.join(os.path.dirname(os.path.abspath(__file__)), "content"))
 
-LEVELS = {
-    "beginner": {"xp_reward": 10, "hearts": 3, "unlock_xp": 0},
-    "intermediate": {"xp_reward": 20, "hearts": 3, "unlock_xp": 50},
-    "advanced": {"xp_reward": 40, "hearts": 3, "unlock_xp": 150}
-}
+SUBJECTS = CONTENT.subjects()
+LEVELS = CONTENT.data("levels")
+ACHIEVEMENTS = CONTENT.data("achievements")
 
-ACHIEVEMENTS = [
-    {"name": "First Steps", "description": "Complete your first lesson", "xp_threshold": 10, "icon": "🌱"},
-    {"name": "Quick Learner", "description": "Earn 50 XP", "xp_threshold": 50, "icon": "⚡"},
-    {"name": "Knowledge Seeker", "description": "Earn 150 XP", "xp_threshold": 150, "icon": "📚"},
-    {"name": "Master Scholar", "description": "Earn 300 XP", "xp_threshold": 300, "icon": "🎓"},
-    {"name": "Perfect Run", "description": "Complete a lesson without losing hearts", "xp_threshold": 0, "icon": "❤️"},
-    {"name": "Streak Master", "description": "Maintain a 5-day streak", "xp_threshold": 0, "icon": "🔥"}
-]
+def get_graph(subject):
+    """Returns the precomputed node index of a subject's learning path"""
+    return learning_graph.get_graph(CONTENT, subject)
 
 # Helper functions for rendering various UI components
 def render_character(character_type="owl"):
@@ -476,85 +300,29 @@ def render_learning_path(subject, completed_nodes=None):
         completed_nodes = []
     
     # Check if the subject has a defined path
-    if subject not in NODE_CONNECTIONS:
+    if subject not in SUBJECTS:
         st.warning(f"No learning path defined for {subject}")
         return
     
-    nodes = NODE_CONNECTIONS[subject]
-    
-    # Prepare SVG dimensions based on node positions
-    max_x = max([node["position"][0] for node in nodes]) + 100
-    max_y = max([node["position"][1] for node in nodes]) + 100
-    
-    # Start SVG container
-    svg = f'<svg width="{max_x}" height="{max_y}" xmlns="http://www.w3.org/2000/svg">'
-    
-    # Draw connections first (so they are behind nodes)
-    for node in nodes:
-        from_x, from_y = node["position"]
-        node_center_x = from_x + 35
-        node_center_y = from_y + 35
-        
-        # Draw connections to other nodes
-        for target_id in node["connects_to"]:
-            # Find target node
-            target_node = next((n for n in nodes if n["id"] == target_id), None)
-            if target_node:
-                to_x, to_y = target_node["position"]
-                to_center_x = to_x + 35
-                to_center_y = to_y + 35
-                
-                # Determine if this connection is completed
-                connection_completed = node["id"] in completed_nodes and target_id in completed_nodes
-                connection_color = "#58cc02" if connection_completed else "#4b4b4b"
-                
-                # Draw the line
-                svg += f'<line x1="{node_center_x}" y1="{node_center_y}" x2="{to_center_x}" y2="{to_center_y}" stroke="{connection_color}" stroke-width="8" />'
-    
-    # Draw nodes
-    for node in nodes:
-        x, y = node["position"]
-        node_id = node["id"]
-        node_type = node["type"]
-        icon = node["icon"]
-        
-        # Determine node status
-        is_completed = node_id in completed_nodes
-        is_active = False
-        is_locked = False
-        
-        # A node is active if all its prerequisites are completed
-        # For simplicity, we'll consider the first node always active if not completed
-        # and other nodes active if at least one of their incoming connections is from a completed node
-        if node_id == "node1" and not is_completed:
-            is_active = True
-        else:
-            # Check if any node that connects to this one is completed
-            for other_node in nodes:
-                if node_id in other_node["connects_to"] and other_node["id"] in completed_nodes:
-                    is_active = True
-                    break
-        
-        # A node is locked if it's not active and not completed
-        is_locked = not is_active and not is_completed
-        
-        # Set node style based on status
-        node_class = "completed" if is_completed else "active" if is_active else "locked"
-        
-        # Set node color based on type
-        type_class = "special-node" if node_type == "special" else ""
-        
-        # Draw the node with its status
-      # Modify the SVG node drawing code to ensure valid element creation
-        svg += f'''
-        <g transform="translate({x}, {y})">
-            <circle cx="35" cy="35" r="35" fill="{get_node_color(is_completed, is_active, is_locked, node_type)}" />
-            <text x="35" y="45" text-anchor="middle" fill="white" font-size="24">{icon}</text>
-        </g>
-        '''
-    
-    # End SVG container
-    svg += '</svg>'
+    graph = get_graph(subject)
+    nodes = graph.nodes
+    statuses = graph.statuses(completed_nodes)
+    
+    # The SVG depends only on node positions and is built once per subject;
+    # this user's progress is applied by a small CSS overlay
+    layout = learning_map.get_path_layout(CONTENT, subject)
+    viewport = None
+    if layout.virtualized:
+        # Large paths are drawn one screen at a time, starting at the first open node
+        focus = next((node_id for node_id in graph.order if statuses[node_id] == "unlocked"), None)
+        left, top, width, height = layout.viewport_around(focus)
+        if layout.width > width:
+            left = st.slider("Scroll path horizontally", 0, layout.width - width, left, key=f"path_left_{subject}")
+        if layout.height > height:
+            top = st.slider("Scroll path vertically", 0, layout.height - height, top, key=f"path_top_{subject}")
+        viewport = layout.clamp_viewport(left, top, width, height)
+        st.markdown(layout.minimap(statuses, viewport), unsafe_allow_html=True)
+    svg = layout.render(statuses, get_status_color, viewport)
     
     # Render the SVG
     st.markdown(f"""
@@ -565,6 +333,10 @@ def render_learning_path(subject, completed_nodes=None):
     
     return nodes
 
+def get_status_color(status, node_type):
+    """Returns the color for a node status from LearningGraph.statuses()"""
+    return get_node_color(status == "completed", status == "unlocked", status == "locked", node_type)
+
 def get_node_color(is_completed, is_active, is_locked, node_type):
     """Returns the appropriate color for a node based on its status"""
     if node_type == "special":
@@ -621,7 +393,7 @@ def init_session_state():
 def start_lesson(subject, node_id):
     """Start a lesson for a specific node"""
     # Find the node data
-    node_data = next((node for node in NODE_CONNECTIONS[subject] if node["id"] == node_id), None)
+    node_data = get_graph(subject).get(node_id)
     
     if node_data:
         level = node_data["level"]
@@ -766,6 +538,7 @@ def show_dashboard():
             # Show available nodes
             if nodes:
                 st.subheader("Available Lessons")
+                statuses = get_graph(subject).statuses(st.session_state.user_data["completed_nodes"][subject])
                 
                 for node in nodes:
                     node_id = node["id"]
@@ -774,18 +547,8 @@ def show_dashboard():
                     icon = node["icon"]
                     
                     # Check if node is accessible
-                    is_completed = node_id in st.session_state.user_data["completed_nodes"][subject]
-                    can_access = False
-                    
-                    # First node is always accessible
-                    if node_id == "node1":
-                        can_access = True
-                    else:
-                        # Check if any prerequisite node is completed
-                        for other_node in nodes:
-                            if node_id in other_node["connects_to"] and other_node["id"] in st.session_state.user_data["completed_nodes"][subject]:
-                                can_access = True
-                                break
+                    is_completed = statuses[node_id] == "completed"
+                    can_access = statuses[node_id] != "locked"
                     
                     # Check if user has enough XP for this level
                     level_accessible = can_access_level(level)
@@ -836,7 +599,7 @@ def show_lesson():
     render_hearts(st.session_state.hearts)
     
     # Get questions for this level
-    questions = QUESTIONS[subject][level]
+    questions = CONTENT.questions(subject, level)
     
     if st.session_state.current_question_index < len(questions):
         # Still have questions to answer
@@ -959,19 +722,19 @@ def show_profile():
             intermediate_progress = st.session_state.user_data["subjects_progress"][subject]["intermediate"]
             advanced_progress = st.session_state.user_data["subjects_progress"][subject]["advanced"]
             
-            total_nodes = sum(1 for node in NODE_CONNECTIONS[subject] if node["level"] == "beginner")
+            total_nodes = sum(1 for node in get_graph(subject).nodes if node["level"] == "beginner")
             if total_nodes > 0:
                 beginner_percentage = int((beginner_progress / total_nodes) * 100)
             else:
                 beginner_percentage = 0
                 
-            total_nodes = sum(1 for node in NODE_CONNECTIONS[subject] if node["level"] == "intermediate") 
+            total_nodes = sum(1 for node in get_graph(subject).nodes if node["level"] == "intermediate") 
             if total_nodes > 0:
                 intermediate_percentage = int((intermediate_progress / total_nodes) * 100)
             else:
                 intermediate_percentage = 0
                 
-            total_nodes = sum(1 for node in NODE_CONNECTIONS[subject] if node["level"] == "advanced")
+            total_nodes = sum(1 for node in get_graph(subject).nodes if node["level"] == "advanced")
             if total_nodes > 0:
                 advanced_percentage = int((advanced_progress / total_nodes) * 100)
             else:
@@ -0,0 +1,181 @@
+import ast
+import threading
+
+# Static checks run on a code submission before it is sent to the sandbox.
+# Parsing takes well under a millisecond, while a sandbox run takes a worker
+# for tens of milliseconds or more. So code that cannot run, or that breaks
+# the question's rules, is turned away here with the line to fix.
+#
+# Rules come from optional question fields, falling back to the defaults
+# below:
+#   "required_function": name or list of names that must be defined at the
+#       top level; for call-style tests it defaults to the called functions
+#   "banned_imports": modules that may not be imported (submodules included)
+#   "banned_calls": functions that may not be called, e.g. "eval", "os.system"
+#   "max_loop_depth": deepest allowed nesting of for/while loops and
+#       comprehensions
+BANNED_IMPORTS = ("ctypes", "multiprocessing", "signal", "socket", "subprocess")
+BANNED_CALLS = ("__import__", "breakpoint", "compile", "eval", "exec")
+MAX_LOOP_DEPTH = None
+
+_stats = {"checked": 0, "rejected": 0, "reasons": {}}
+_stats_lock = threading.Lock()
+
+
+def _dotted_name(node):
+    """Returns "os.system" for the expression os.system, None for anything not a plain name chain"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def called_functions(expressions):
+    """Returns the names of the functions called by test expressions such as "calculator(5, 3, '+')" """
+    names = []
+    for expression in expressions:
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError:
+            continue
+        if isinstance(tree.body, ast.Call):
+            name = _dotted_name(tree.body.func)
+            if name and "." not in name and name not in names:
+                names.append(name)
+    return names
+
+
+def _listify(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def rules_for(question):
+    """Returns the rules that apply to a question as a dict"""
+    required = question.get("required_function")
+    if required is None and question.get("test_style") == "call":
+        required = called_functions(test_case["input"] for test_case in question.get("test_cases", []))
+    return {
+        "required_function": _listify(required),
+        "banned_imports": _listify(question.get("banned_imports", BANNED_IMPORTS)),
+        "banned_calls": _listify(question.get("banned_calls", BANNED_CALLS)),
+        "max_loop_depth": question.get("max_loop_depth", MAX_LOOP_DEPTH),
+    }
+
+
+class _Checker(ast.NodeVisitor):
+    LOOPS = (ast.For, ast.AsyncFor, ast.While)
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.problems = []
+        self.depth = 0
+        self.deepest_reported = False
+
+    def report(self, node, reason, message):
+        self.problems.append({"line": getattr(node, "lineno", None), "reason": reason, "message": message})
+
+    def _enter_loop(self, node):
+        limit = self.rules["max_loop_depth"]
+        self.depth += 1
+        if limit is not None and self.depth > limit and not self.deepest_reported:
+            self.deepest_reported = True
+            self.report(node, "loop_depth", f"loops are nested {self.depth} deep, at most {limit} allowed")
+
+    def _check_module(self, node, module):
+        for banned in self.rules["banned_imports"]:
+            if module == banned or module.startswith(banned + "."):
+                self.report(node, "banned_import", f"importing {module} is not allowed")
+                return
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._check_module(node, alias.name)
+
+    def visit_ImportFrom(self, node):
+        if node.module and not node.level:
+            self._check_module(node, node.module)
+
+    def visit_Call(self, node):
+        name = _dotted_name(node.func)
+        if name in self.rules["banned_calls"]:
+            self.report(node, "banned_call", f"calling {name}() is not allowed")
+        self.generic_visit(node)
+
+    def _visit_comprehension(self, node, *results):
+        # Each generator is one more loop around the ones after it and the
+        # result, so [x*y for x in r for y in r] is nested two deep
+        entered = 0
+        for generator in node.generators:
+            self.visit(generator.iter)
+            self._enter_loop(node)
+            entered += 1
+            self.visit(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for result in results:
+            self.visit(result)
+        self.depth -= entered
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, node.elt)
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, node.key, node.value)
+
+    def generic_visit(self, node):
+        is_loop = isinstance(node, self.LOOPS)
+        if is_loop:
+            self._enter_loop(node)
+        super().generic_visit(node)
+        if is_loop:
+            self.depth -= 1
+
+
+def check(question, code):
+    """Returns the problems that keep code from being run, as dicts with line, reason and message"""
+    problems = []
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        column = f", column {e.offset}" if e.offset else ""
+        problems.append({"line": e.lineno, "reason": "syntax", "message": f"SyntaxError: {e.msg}{column}"})
+    except ValueError as e:
+        problems.append({"line": None, "reason": "syntax", "message": str(e)})
+    else:
+        rules = rules_for(question)
+        defined = {node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        for name in rules["required_function"]:
+            if name not in defined:
+                problems.append({"line": None, "reason": "missing_function", "message": f"define a function named {name}"})
+        checker = _Checker(rules)
+        checker.visit(tree)
+        problems.extend(checker.problems)
+        problems.sort(key=lambda problem: problem["line"] or 0)
+
+    with _stats_lock:
+        _stats["checked"] += 1
+        if problems:
+            _stats["rejected"] += 1
+            for reason in {problem["reason"] for problem in problems}:
+                _stats["reasons"][reason] = _stats["reasons"].get(reason, 0) + 1
+    return problems
+
+
+def format_problem(problem):
+    return f"Line {problem['line']}: {problem['message']}" if problem["line"] else problem["message"]
+
+
+def stats():
+    """Returns how many submissions were checked and rejected, i.e. sandbox dispatches saved"""
+    with _stats_lock:
+        result = dict(_stats, reasons=dict(_stats["reasons"]))
+    result["dispatch_reduction"] = result["rejected"] / result["checked"] if result["checked"] else 0.0
+    return result
@@ -0,0 +1,141 @@
+import hashlib
+import itertools
+import json
+import random
+import threading
+
+# In-memory index over every question of a content pack. Each question gets a
+# stable ID (its own "id" field, or a hash of subject, node and content) and
+# is filed under every combination of the dimensions below, so a lookup such
+# as "3 code questions from node4" is one dict access plus an O(k) sample.
+DIMENSIONS = ("subject", "node", "type", "level", "tag")
+QUESTION_TYPES = ("single_choice", "multiple_choice", "numerical", "match", "code", "graph")
+DEFAULT_TYPE = "single_choice"
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def question_id(subject, node, question):
+    """Returns a stable ID derived from where a question lives and what it says"""
+    content = {key: value for key, value in question.items() if key != "id"}
+    payload = json.dumps([subject, node, content], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _key(filters):
+    return tuple((name, filters[name]) for name in DIMENSIONS if filters.get(name) is not None)
+
+
+class QuestionIndex:
+    """Questions keyed by subject, node, type, level and tag"""
+
+    def __init__(self):
+        self._questions = {}
+        # question id -> (subject, node, type, level, tags, source)
+        self._records = {}
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._questions)
+
+    def add(self, question, subject, node, source=None, level=None):
+        """Files a question under all of its keys and returns its ID.
+
+        level is the node's level, used when the question does not set its own.
+        """
+        qid = question.get("id") or question_id(subject, node, question)
+        with self._lock:
+            if qid in self._questions:
+                return qid
+            question.setdefault("id", qid)
+            tags = tuple(question.get("tags", ()))
+            record = (subject, node, question.get("type", DEFAULT_TYPE), question.get("level", level), tags, source)
+            self._questions[qid] = question
+            self._records[qid] = record
+            for key in self._keys_for(record):
+                self._postings.setdefault(key, []).append(qid)
+        return qid
+
+    def _keys_for(self, record):
+        subject, node, question_type, level, tags, _ = record
+        base = [("subject", subject), ("node", node), ("type", question_type), ("level", level)]
+        base = [pair for pair in base if pair[1] is not None]
+        keys = set()
+        for size in range(len(base) + 1):
+            for combo in itertools.combinations(base, size):
+                if combo:
+                    keys.add(combo)
+                for tag in tags:
+                    keys.add(combo + (("tag", tag),))
+        return keys
+
+    def remove_source(self, source):
+        """Drops every question that was added with the given source"""
+        with self._lock:
+            stale = {qid for qid, record in self._records.items() if record[5] == source}
+            if not stale:
+                return 0
+            for qid in stale:
+                del self._questions[qid]
+                del self._records[qid]
+            # Readers may be holding the old lists, so replace rather than edit them
+            postings = {}
+            for key, ids in self._postings.items():
+                kept = [qid for qid in ids if qid not in stale]
+                if kept:
+                    postings[key] = kept
+            self._postings = postings
+            return len(stale)
+
+    def get(self, qid):
+        """Returns the question with this ID, or None"""
+        return self._questions.get(qid)
+
+    def ids(self, **filters):
+        """Returns the IDs matching every given filter, in load order"""
+        return self._postings.get(_key(filters), [])
+
+    def count(self, **filters):
+        return len(self.ids(**filters))
+
+    def select(self, **filters):
+        """Returns every question matching the filters, in load order"""
+        return [self._questions[qid] for qid in self.ids(**filters)]
+
+    def sample(self, k, **filters):
+        """Returns k random questions matching the filters (all of them, in order, if there are fewer)"""
+        ids = self.ids(**filters)
+        if len(ids) > k:
+            ids = random.sample(ids, k)
+        return [self._questions[qid] for qid in ids]
+
+    def sample_mix(self, mix, **filters):
+        """Samples per question type, e.g. {"code": 3, "single_choice": 5}"""
+        unknown = set(mix) - set(QUESTION_TYPES)
+        if unknown:
+            raise ValueError(f"unknown question types: {', '.join(sorted(unknown))}")
+        questions = []
+        for question_type, k in mix.items():
+            questions.extend(self.sample(k, type=question_type, **filters))
+        return questions
+
+
+def build_index(pack):
+    """Indexes every question bank of a content pack"""
+    index = QuestionIndex()
+    for subject in pack.subjects():
+        levels = {node["id"]: node.get("level") for node in pack.graph(subject)}
+        for node in pack.question_keys(subject):
+            for question in pack.questions(subject, node):
+                index.add(question, subject, node, source=pack.root, level=levels.get(node))
+    return index
+
+
+def get_index(pack):
+    """Returns the shared QuestionIndex for a content pack, building it on first use"""
+    with _indexes_lock:
+        if pack.root not in _indexes:
+            _indexes[pack.root] = build_index(pack)
+        return _indexes[pack.root]
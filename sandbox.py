@@ -0,0 +1,875 @@
+import ast
+import atexit
+import errno
+import io
+import json
+import math
+import os
+import pathlib
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Execution engine for code questions. A pool of long-lived worker processes
+# (python sandbox.py worker) is started next to the app; each has the modules
+# below already imported. Per submission a worker forks a child, which is
+# cheap because everything is already loaded. The child runs the code
+# under CPU, memory and file-size limits in a scratch directory, with stdin
+# and stdout replaced, and reports back through a pipe. The worker enforces
+# the wall-clock limit and kills the child when it runs over.
+#
+# The isolation boundary is the filesystem root and the user. Run as root,
+# the worker chroots each child into its scratch directory, with fresh
+# network and mount namespaces, and drops it to SANDBOX_UID. Otherwise the
+# child does the same from inside a new user namespace, mapped to
+# SANDBOX_UID there, and then gives up every capability the namespace
+# granted it, so it cannot chroot again to climb out. Inside the chroot the
+# working directory sits at the same path as the scratch directory outside
+# it, so the audit hook below checks paths against one real location. Only
+# modules already imported by the worker (PRELOAD and their dependencies)
+# can be imported in there.
+#
+# An audit hook comes on top. It refuses network access, process spawning
+# and introspection that could reach the hook itself, and file access
+# outside the scratch directory. It is not trusted on its own: when neither
+# kind of chroot is possible, the child refuses to run the code unless
+# REQUIRE_ISOLATION is turned off. Without os.fork (Windows), each run gets
+# a fresh interpreter and only the wall-clock limit applies.
+WORKERS = os.cpu_count() or 2
+CPU_SECONDS = 2
+WALL_SECONDS = 5
+MEMORY_MB = 256
+FILE_SIZE_KB = 1024
+OUTPUT_LIMIT = 64 * 1024
+PRELOAD = ("array", "bisect", "collections", "copy", "dataclasses", "datetime", "decimal", "enum", "fractions",
+           "functools", "heapq", "itertools", "json", "math", "operator", "pathlib", "random", "re", "statistics",
+           "string", "textwrap", "typing", "unicodedata")
+SANDBOX_UID = 65534
+REQUIRE_ISOLATION = True
+BLOCKED_EVENTS = ("socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork",
+                  "os.kill", "os.killpg", "os.link", "os.symlink", "ctypes.", "webbrowser.",
+                  "urllib.Request", "gc.", "sys._getframe", "sys._current_frames", "sys.settrace",
+                  "sys.setprofile")
+# Audited file events -> (positions of path arguments, positions of dir_fd arguments)
+PATH_EVENTS = {
+    "open": ((0,), ()),
+    "os.remove": ((0,), (1,)),
+    "os.rename": ((0, 1), (2, 3)),
+    "os.rmdir": ((0,), (1,)),
+    "os.mkdir": ((0,), (2,)),
+    "os.chmod": ((0,), (2,)),
+    "os.chown": ((0,), (3,)),
+    "os.utime": ((0,), (3,)),
+    "os.truncate": ((0,), ()),
+    "os.chdir": ((0,), ()),
+    "os.listdir": ((0,), ()),
+    "os.scandir": ((0,), ()),
+    "shutil.rmtree": ((0,), (1,)),
+}
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+PR_CAPBSET_DROP = 24
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+SUBMISSION = "<submission>"
+# Call-style tests run in one interpreter, each expression with its own time
+# budget; the job's CPU and wall limits grow by the same amount per expression.
+# Loading the module itself only gets the usual CPU_SECONDS and WALL_SECONDS.
+EXPRESSION_SECONDS = 1
+FLOAT_TOLERANCE = 1e-9
+# Statuses that mean the sandbox failed rather than the submitted code; the
+# code was not judged, so they are neither a pass nor a failure
+SYSTEM_STATUSES = ("unavailable",)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# In a worker: the pipe the pool writes cancelled job numbers to, and the
+# highest number read from it so far
+_cancels = {"fd": None, "seq": 0}
+# In a worker: libc, loaded before any child runs, for unshare()
+_native = {"libc": None}
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised in the child when the submission prints more than OUTPUT_LIMIT characters"""
+
+
+class ExpressionTimeout(BaseException):
+    """Raised in the child when one test expression runs past EXPRESSION_SECONDS"""
+
+
+class LoadTimeout(BaseException):
+    """Raised in the child when loading a call job's module runs past its time limits"""
+
+
+class _LimitedOutput(io.StringIO):
+    def write(self, text):
+        if self.tell() + len(text) > OUTPUT_LIMIT:
+            super().write(text[:OUTPUT_LIMIT - self.tell()])
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+
+def _make_audit_hook(scratch):
+    """Returns an audit hook that refuses BLOCKED_EVENTS and file access outside scratch.
+
+    Everything the hook uses is bound as an immutable default argument when
+    it is made. The submission can rebind module globals or builtins, or see
+    the hook's locals in a traceback, but none of that changes the hook.
+    The events that could reach the hook object itself are blocked.
+    """
+    readable = tuple({os.path.join(os.path.normpath(prefix), "")
+                      for prefix in (sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix)})
+
+    def hook(event, args, blocked=BLOCKED_EVENTS, path_events=types.MappingProxyType(dict(PATH_EVENTS)), scratch=os.path.join(scratch, ""),
+             readable=readable, read_modes=("r", "rb", "rt", "br", "tr"), getcwd=os.getcwd, len=len, type=type,
+             str=str, bytes=bytes, int=int, path_types=(pathlib.PurePosixPath, pathlib.PosixPath),
+             path_str=pathlib.PurePath.__str__, refuse=PermissionError):
+        if event.startswith(blocked):
+            raise refuse(f"{event} is not allowed in the sandbox")
+        positions = path_events.get(event)
+        if positions is None:
+            return
+        paths, dir_fds = positions
+        for position in dir_fds:
+            if position < len(args) and args[position] not in (None, -1):
+                raise refuse(f"{event} with dir_fd is not allowed in the sandbox")
+        for position in paths:
+            path = args[position] if position < len(args) else None
+            if path is None:
+                path = "."
+            if type(path) is int:
+                continue
+            if type(path) is bytes:
+                path = bytes.decode(path, "utf-8", "surrogateescape")
+            elif type(path) in path_types:
+                path = path_str(path)
+            elif type(path) is not str:
+                raise refuse(f"{event} with a {type(path).__name__} path is not allowed in the sandbox")
+            if not path.startswith("/"):
+                # os.open() may resolve relative paths against a dir_fd the event does not report
+                if event == "open" and args[1] is None:
+                    raise refuse("os.open() needs an absolute path in the sandbox")
+                path = getcwd() + "/" + path
+            parts = []
+            for part in path.split("/"):
+                if part == "..":
+                    if parts:
+                        parts.pop()
+                elif part and part != ".":
+                    parts.append(part)
+            path = "/" + "/".join(parts) + "/"
+            if path.startswith(scratch):
+                continue
+            # Reading the Python installation is what importing a module does
+            reading = event in ("os.listdir", "os.scandir") or (event == "open" and args[1] in read_modes)
+            if reading and path.startswith(readable):
+                continue
+            raise refuse(f"{event} outside the scratch directory is not allowed in the sandbox")
+
+    return hook
+
+
+def _error_message(error):
+    """Formats an exception with the submission's line number, hiding sandbox frames"""
+    if isinstance(error, SyntaxError) and error.filename == SUBMISSION:
+        return f"Line {error.lineno}: SyntaxError: {error.msg}"
+    lines = [frame.lineno for frame in traceback.extract_tb(error.__traceback__) if frame.filename == SUBMISSION]
+    message = "".join(traceback.format_exception_only(type(error), error)).strip()
+    return f"Line {lines[-1]}: {message}" if lines else message
+
+
+def _status(error):
+    """Returns (status, message) for an exception that stopped the submission"""
+    if isinstance(error, MemoryError):
+        return "memory", "Memory limit exceeded"
+    if isinstance(error, OutputLimitExceeded):
+        return "output_limit", f"Output limit exceeded ({OUTPUT_LIMIT} characters)"
+    return "error", _error_message(error)
+
+
+def values_equal(actual, expected):
+    """Compares a returned value with an expected one from the question's JSON.
+
+    Booleans only equal booleans, ints and floats are compared with a small
+    tolerance, and lists and tuples are interchangeable, recursively.
+    """
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return isinstance(actual, bool) and isinstance(expected, bool) and actual == expected
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(actual, expected, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE)
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        return len(actual) == len(expected) and all(map(values_equal, actual, expected))
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return actual.keys() == expected.keys() and all(values_equal(actual[key], expected[key]) for key in expected)
+    return actual == expected
+
+
+def _expression_timeout(signum, frame):
+    raise ExpressionTimeout()
+
+
+def _load_timeout(signum, frame):
+    raise LoadTimeout(signum)
+
+
+def _evaluate(expression, expected, namespace):
+    """Evaluates one test expression, returning its value, verdict, exception and timing"""
+    outcome = {"expression": expression, "value": None, "pass": False, "error": None, "exception": None, "status": "ok"}
+    timer = hasattr(signal, "setitimer")
+    started = time.perf_counter()
+    try:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, EXPRESSION_SECONDS)
+        try:
+            value = eval(compile(expression, SUBMISSION, "eval"), namespace)
+        finally:
+            if timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        outcome["value"] = repr(value)
+        outcome["pass"] = values_equal(value, expected)
+    except ExpressionTimeout:
+        outcome.update(status="timeout", exception="TimeoutError", error=f"Time limit exceeded ({EXPRESSION_SECONDS} s)")
+    except Exception as e:
+        outcome.update(exception=type(e).__name__, error=_error_message(e))
+    outcome["time_ms"] = (time.perf_counter() - started) * 1000
+    return outcome
+
+
+def _last_function(namespace):
+    functions = [value for value in namespace.values()
+                 if isinstance(value, types.FunctionType) and value.__code__.co_filename == SUBMISSION]
+    return functions[-1] if functions else None
+
+
+def execute(job):
+    """Runs one job in the current process and returns its result.
+
+    A "script" job runs the code with job["stdin"] as standard input. If it
+    prints nothing but defines a function, that function is called with the
+    input parsed as Python literals, so "def square(n)" answers "5" -> "25".
+    A "call" job loads the code as a module once and evaluates each of
+    job["expressions"] against it in this interpreter, with job["stop_on_failure"]
+    skipping the rest after the first failure.
+    """
+    output = _LimitedOutput()
+    namespace = {"__name__": "__main__" if job["mode"] == "script" else "submission", "__builtins__": __builtins__}
+    result = {"status": "ok", "stdout": "", "error": None}
+    sys.stdin = io.StringIO(job.get("stdin", ""))
+    sys.stdout = sys.stderr = output
+    started = time.perf_counter()
+    # A call job's limits include every expression's budget; the module load
+    # must not be able to spend them
+    load_timer = job["mode"] == "call" and hasattr(signal, "setitimer")
+    try:
+        if load_timer:
+            signal.signal(signal.SIGALRM, _load_timeout)
+            signal.signal(signal.SIGPROF, _load_timeout)
+            signal.setitimer(signal.ITIMER_REAL, job.get("load_wall_seconds", WALL_SECONDS))
+            signal.setitimer(signal.ITIMER_PROF, job.get("load_cpu_seconds", CPU_SECONDS))
+        try:
+            exec(compile(job["code"], SUBMISSION, "exec"), namespace)
+        finally:
+            if load_timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.setitimer(signal.ITIMER_PROF, 0)
+        if job["mode"] == "script" and not output.getvalue():
+            function = _last_function(namespace)
+            if function is not None and job.get("stdin", "").strip():
+                args = ast.literal_eval(job["stdin"].strip())
+                value = function(*args) if isinstance(args, tuple) else function(args)
+                if value is not None:
+                    print(value)
+        elif job["mode"] == "call":
+            result["load_ms"] = (time.perf_counter() - started) * 1000
+            if hasattr(signal, "setitimer"):
+                signal.signal(signal.SIGALRM, _expression_timeout)
+            result["results"] = []
+            for expression, expected in zip(job["expressions"], job["expected"]):
+                if job.get("stop_on_failure") and any(not outcome["pass"] for outcome in result["results"]):
+                    result["results"].append({"expression": expression, "status": "cancelled", "pass": None})
+                    continue
+                result["results"].append(_evaluate(expression, expected, namespace))
+    except SystemExit:
+        pass
+    except LoadTimeout as e:
+        if e.args[0] == signal.SIGPROF:
+            error = f"CPU time limit exceeded ({job.get('load_cpu_seconds', CPU_SECONDS)} s)"
+        else:
+            error = f"Time limit exceeded ({job.get('load_wall_seconds', WALL_SECONDS)} s)"
+        result["status"], result["error"] = "timeout", error
+    except BaseException as e:
+        result["status"], result["error"] = _status(e)
+    result["stdout"] = output.getvalue()
+    return result
+
+
+def _unshare(flags):
+    libc = _native["libc"]
+    return libc is not None and libc.unshare(flags) == 0
+
+
+def _drop_capabilities():
+    """Empties the capability bounding set and clears every capability this process holds"""
+    import ctypes
+
+    libc = _native["libc"]
+    if libc is None:
+        return False
+    for capability in range(64):
+        if libc.prctl(PR_CAPBSET_DROP, capability, 0, 0, 0) != 0:
+            if ctypes.get_errno() == errno.EINVAL:
+                # Past the last capability this kernel knows
+                break
+            return False
+    if libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0:
+        return False
+    header = (ctypes.c_uint32 * 2)(LINUX_CAPABILITY_VERSION_3, 0)
+    # effective, permitted and inheritable sets, two 32-bit words each
+    data = (ctypes.c_uint32 * 6)()
+    return libc.capset(header, data) == 0
+
+
+def _isolate(scratch):
+    """Confines the child to scratch as its filesystem root; returns "chroot", "userns" or None.
+
+    On success the working directory is scratch/scratch, which the child
+    sees at the path scratch.
+    """
+    if not hasattr(os, "chroot"):
+        return None
+    workdir = os.path.join(scratch, scratch.lstrip(os.sep))
+    os.makedirs(workdir, exist_ok=True)
+    if os.geteuid() == 0:
+        _unshare(CLONE_NEWNS | CLONE_NEWNET)
+        for path in (scratch, workdir):
+            os.chown(path, SANDBOX_UID, SANDBOX_UID)
+        try:
+            os.chroot(scratch)
+        except OSError:
+            return None
+        os.chdir(scratch)
+        # Failing to drop root inside the chroot must not go unnoticed, so no
+        # try. Leaving uid 0 clears every capability.
+        os.setgroups([])
+        os.setgid(SANDBOX_UID)
+        os.setuid(SANDBOX_UID)
+        return "chroot"
+    uid, gid = os.getuid(), os.getgid()
+    if not _unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWNET):
+        return None
+    try:
+        for name, text in (("setgroups", "deny"), ("uid_map", f"{SANDBOX_UID} {uid} 1"),
+                           ("gid_map", f"{SANDBOX_UID} {gid} 1")):
+            with open(f"/proc/self/{name}", "w") as file:
+                file.write(text)
+        os.chroot(scratch)
+    except OSError:
+        return None
+    os.chdir(scratch)
+    # The new namespace gave this process every capability in it, including
+    # the one that lets it chroot again and walk out of the jail
+    if not _drop_capabilities():
+        return None
+    return "userns"
+
+
+def _apply_limits(job, scratch):
+    if resource is not None:
+        cpu = job.get("cpu_seconds", CPU_SECONDS)
+        memory = job.get("memory_mb", MEMORY_MB) * 1024 * 1024
+        file_size = job.get("file_size_kb", FILE_SIZE_KB) * 1024
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    sys.addaudithook(_make_audit_hook(scratch))
+
+
+def _child(job, scratch, write_fd):
+    # The worker's stdin/stdout carry the job protocol; keep the submission off them
+    if _cancels["fd"] is not None:
+        os.close(_cancels["fd"])
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.chdir(scratch)
+    os.setsid()
+    isolation = _isolate(scratch)
+    if isolation is None and REQUIRE_ISOLATION:
+        result = {"status": "unavailable", "stdout": "", "error": "Code can't be run here: the sandbox could not "
+                  "isolate it (the worker needs root or unprivileged user namespaces)"}
+    else:
+        _apply_limits(job, scratch)
+        result = execute(job)
+    result["isolation"] = isolation
+    data = json.dumps(result).encode("utf-8")
+    while data:
+        data = data[os.write(write_fd, data):]
+
+
+def _read_cancels():
+    """Drains the cancel pipe and returns the highest cancelled job number"""
+    if _cancels["fd"] is not None:
+        try:
+            data = os.read(_cancels["fd"], 4096)
+        except BlockingIOError:
+            data = b""
+        for number in data.split():
+            _cancels["seq"] = max(_cancels["seq"], int(number))
+    return _cancels["seq"]
+
+
+def run_forked(job):
+    """Runs a job in a forked child with limits applied; used by the workers"""
+    seq = job.get("seq", 0)
+    if seq and _read_cancels() >= seq:
+        return _cancelled_result()
+    wall = job.get("wall_seconds", WALL_SECONDS)
+    scratch = tempfile.mkdtemp(prefix="oz-sandbox-")
+    read_fd, write_fd = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            _child(job, scratch, write_fd)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    watched = [read_fd] + ([_cancels["fd"]] if seq and _cancels["fd"] is not None else [])
+    chunks, stopped = [], None
+    deadline = started + wall
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                stopped = "timeout"
+                break
+            ready, _, _ = select.select(watched, [], [], remaining)
+            if read_fd in ready:
+                chunk = os.read(read_fd, 65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            elif ready and _read_cancels() >= seq:
+                stopped = "cancelled"
+                break
+    finally:
+        os.close(read_fd)
+        if stopped:
+            os.kill(pid, signal.SIGKILL)
+        _, wait_status = os.waitpid(pid, 0)
+        shutil.rmtree(scratch, ignore_errors=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if stopped == "cancelled":
+        return dict(_cancelled_result(), time_ms=elapsed)
+    if stopped == "timeout":
+        return {"status": "timeout", "stdout": "", "error": f"Time limit exceeded ({wall} s)", "time_ms": elapsed}
+    try:
+        result = json.loads(b"".join(chunks))
+    except ValueError:
+        if os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) in (signal.SIGXCPU, signal.SIGKILL):
+            cpu = job.get("cpu_seconds", CPU_SECONDS)
+            return {"status": "timeout", "stdout": "", "error": f"CPU time limit exceeded ({cpu} s)", "time_ms": elapsed}
+        return {"status": "crashed", "stdout": "", "error": "The program was terminated", "time_ms": elapsed}
+    result["time_ms"] = elapsed
+    return result
+
+
+def run_fresh(job):
+    """Runs a job in a new interpreter; the fallback where os.fork is unavailable"""
+    wall = job.get("wall_seconds", WALL_SECONDS)
+    scratch = tempfile.mkdtemp(prefix="oz-sandbox-")
+    started = time.perf_counter()
+    try:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "once"], input=json.dumps(job),
+                                   capture_output=True, text=True, timeout=wall, cwd=scratch)
+        result = json.loads(completed.stdout)
+    except subprocess.TimeoutExpired:
+        result = {"status": "timeout", "stdout": "", "error": f"Time limit exceeded ({wall} s)"}
+    except ValueError:
+        result = {"status": "crashed", "stdout": "", "error": "The program was terminated"}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    result["time_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def _cancelled_result():
+    return {"status": "cancelled", "stdout": "", "error": "Skipped after an earlier test failed", "time_ms": 0.0}
+
+
+def serve(cancel_fd=None):
+    """Worker loop: one JSON job per line on stdin, one JSON result per line on stdout.
+
+    Writing a job's "seq" number to cancel_fd kills it if it is still queued
+    or running; it then reports status "cancelled".
+    """
+    for module in PRELOAD:
+        __import__(module)
+    if sys.platform.startswith("linux"):
+        import ctypes
+        _native["libc"] = ctypes.CDLL(None, use_errno=True)
+    if cancel_fd is not None:
+        os.set_blocking(cancel_fd, False)
+        _cancels["fd"] = cancel_fd
+    run = run_forked if hasattr(os, "fork") else run_fresh
+    for line in sys.stdin:
+        if line.strip():
+            sys.stdout.write(json.dumps(run(json.loads(line))) + "\n")
+            sys.stdout.flush()
+
+
+class _Worker:
+    def __init__(self):
+        command = [sys.executable, os.path.abspath(__file__), "worker"]
+        self.cancel_fd = None
+        if hasattr(os, "fork"):
+            read_fd, self.cancel_fd = os.pipe()
+            self.process = subprocess.Popen(command + [str(read_fd)], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            text=True, bufsize=1, pass_fds=(read_fd,))
+            os.close(read_fd)
+        else:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        # Jobs are numbered so a late cancel can never hit the next job
+        self.seq = 0
+        self.busy = False
+        self.lock = threading.Lock()
+
+    def run(self, job, cancellation=None):
+        with self.lock:
+            if cancellation is not None and cancellation.is_set():
+                return _cancelled_result()
+            self.seq += 1
+            job = dict(job, seq=self.seq)
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+            self.busy = True
+        try:
+            line = self.process.stdout.readline()
+        finally:
+            with self.lock:
+                self.busy = False
+        if not line:
+            raise OSError("sandbox worker exited")
+        return json.loads(line)
+
+    def cancel(self):
+        with self.lock:
+            if self.busy and self.cancel_fd is not None:
+                os.write(self.cancel_fd, f"{self.seq}\n".encode())
+
+    def close(self):
+        if self.cancel_fd is not None:
+            os.close(self.cancel_fd)
+            self.cancel_fd = None
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class Cancellation:
+    """Stops the jobs of one batch: queued ones are skipped, running ones killed"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.workers = set()
+        self.lock = threading.Lock()
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            for worker in self.workers:
+                worker.cancel()
+
+    def attach(self, worker):
+        with self.lock:
+            self.workers.add(worker)
+
+    def detach(self, worker):
+        with self.lock:
+            self.workers.discard(worker)
+
+
+class SandboxPool:
+    """Up to size warm workers, shared by every session of the app"""
+
+    def __init__(self, size=WORKERS, **limits):
+        self.size = size
+        self.limits = limits
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._workers = []
+        self._executor = None
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._started < self.size:
+                self._started += 1
+                worker = _Worker()
+                self._workers.append(worker)
+                return worker
+        return self._idle.get()
+
+    def _discard(self, worker):
+        with self._lock:
+            self._started -= 1
+            self._workers.remove(worker)
+        worker.close()
+
+    def warm(self):
+        """Starts every worker now instead of on first use"""
+        workers = []
+        while len(workers) < self.size and (self._started < self.size or not self._idle.empty()):
+            workers.append(self._acquire())
+        for worker in workers:
+            self._idle.put(worker)
+
+    def submit(self, job, cancellation=None):
+        """Runs a job dict on an idle worker and returns the result dict"""
+        job = dict(self.limits, **job)
+        worker = self._acquire()
+        if cancellation is not None:
+            cancellation.attach(worker)
+        try:
+            result = worker.run(job, cancellation)
+        except (OSError, ValueError) as e:
+            self._discard(worker)
+            return {"status": "unavailable", "stdout": "", "error": f"Sandbox failure: {e}", "time_ms": 0.0}
+        finally:
+            if cancellation is not None:
+                cancellation.detach(worker)
+        self._idle.put(worker)
+        return result
+
+    def run_all(self, jobs, failed=None):
+        """Runs jobs concurrently and yields (index, result) as each one finishes.
+
+        If failed(index, result) is given, the first result it flags cancels the
+        jobs still queued or running; they are yielded with status "cancelled".
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sandbox")
+        cancellation = Cancellation()
+        futures = {self._executor.submit(self.submit, job, cancellation): index for index, job in enumerate(jobs)}
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except CancelledError:
+                    result = _cancelled_result()
+                if failed is not None and not cancellation.is_set() and failed(futures[future], result):
+                    cancellation.cancel()
+                    for pending in futures:
+                        pending.cancel()
+                yield futures[future], result
+        finally:
+            # The caller stopped reading: don't leave work running on its behalf
+            if not all(future.done() for future in futures):
+                cancellation.cancel()
+                for pending in futures:
+                    pending.cancel()
+
+    def run(self, code, stdin=""):
+        """Runs code as a script with the given standard input"""
+        return self.submit({"mode": "script", "code": code, "stdin": stdin})
+
+    def call(self, code, expressions, expected, stop_on_failure=False):
+        """Loads code as a module once and evaluates call expressions such as "square(5)" against it"""
+        expressions = list(expressions)
+        budget = len(expressions) * EXPRESSION_SECONDS
+        cpu = self.limits.get("cpu_seconds", CPU_SECONDS)
+        wall = self.limits.get("wall_seconds", WALL_SECONDS)
+        return self.submit({"mode": "call", "code": code, "expressions": expressions, "expected": list(expected),
+                            "stop_on_failure": stop_on_failure, "load_cpu_seconds": cpu, "load_wall_seconds": wall,
+                            "cpu_seconds": cpu + budget, "wall_seconds": wall + budget})
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._started = 0
+        for worker in workers:
+            worker.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def outputs_match(actual, expected):
+    """Compares program output, ignoring trailing whitespace on each line and at the end"""
+    def normalise(text):
+        return "\n".join(line.rstrip() for line in str(text).strip("\n").splitlines()).rstrip()
+    return normalise(actual) == normalise(expected)
+
+
+def _case_result(test_case, result):
+    """Turns a script job's result into the test result shown to the learner"""
+    passed = None if result["status"] == "cancelled" or result["status"] in SYSTEM_STATUSES else (
+        result["status"] == "ok" and outputs_match(result["stdout"], test_case["expected"]))
+    return {"input": test_case["input"], "expected": test_case["expected"], "output": result["stdout"],
+            "error": result["error"], "status": result["status"], "pass": passed, "time_ms": result.get("time_ms")}
+
+
+def _call_result(test_case, result, index):
+    """Picks one expression's outcome out of a call batch's result"""
+    if result["status"] != "ok":
+        # The module failed to load, or the whole batch was stopped
+        return {"input": test_case["input"], "expected": test_case["expected"], "output": None,
+                "error": result["error"], "status": result["status"],
+                "pass": None if result["status"] in SYSTEM_STATUSES else False}
+    outcome = result["results"][index]
+    return {"input": test_case["input"], "expected": test_case["expected"], "output": outcome.get("value"),
+            "error": outcome.get("error"), "exception": outcome.get("exception"), "status": outcome["status"],
+            "pass": outcome["pass"], "time_ms": outcome.get("time_ms")}
+
+
+def grade(question, code, pool=None, stop_on_failure=False):
+    """Runs a code question's test cases, yielding (index, test result) as each finishes.
+
+    Script-style cases run concurrently, one job each. Call-style cases
+    (expressions such as "calculator(5, 3, '+')") are one job: the
+    submission is loaded once and every expression evaluated in that
+    interpreter. "pass" is None for cases skipped because an earlier one failed.
+    """
+    pool = pool or get_pool()
+    cases = question["test_cases"]
+    if question.get("test_style") == "call":
+        result = pool.call(code, [test_case["input"] for test_case in cases],
+                           [test_case["expected"] for test_case in cases], stop_on_failure)
+        for index, test_case in enumerate(cases):
+            yield index, _call_result(test_case, result, index)
+        return
+    jobs = [{"mode": "script", "code": code, "stdin": test_case["input"]} for test_case in cases]
+    failed = None
+    if stop_on_failure:
+        failed = lambda index, result: _case_result(cases[index], result)["pass"] is False
+    for index, result in pool.run_all(jobs, failed):
+        yield index, _case_result(cases[index], result)
+
+
+def get_pool():
+    """Returns the shared SandboxPool, created on first use"""
+    with _pools_lock:
+        if "default" not in _pools:
+            _pools["default"] = SandboxPool()
+            atexit.register(_pools["default"].close)
+        return _pools["default"]
+
+
+# Submissions that try to leave the scratch directory; {path} is a file outside it
+ESCAPES = {
+    "direct read": 'print(open({path!r}).read())',
+    "relative read": 'import os\nprint(open("../" * 20 + {path!r}.lstrip("/")).read())',
+    "chroot climb": 'import os\nos.mkdir("x")\nos.chroot("x")\nos.chroot("../" * 20)\nos.chdir("/")\n'
+                    'print(open({path!r}).read())',
+    "chdir climb": 'import os\nos.chdir("../" * 20)\nprint(open({path!r}.lstrip("/")).read())',
+}
+
+
+def check_escapes(pool):
+    """Runs every ESCAPES submission against a secret file; returns {name: result} for those that read it"""
+    secret = f"sandbox-canary-{os.getpid()}-{time.time_ns()}"
+    handle, path = tempfile.mkstemp(prefix="oz-canary-")
+    try:
+        with os.fdopen(handle, "w") as file:
+            file.write(secret)
+        # Readable by the sandbox user, so only the sandbox stands in the way
+        os.chmod(path, 0o644)
+        escaped = {}
+        for name, code in ESCAPES.items():
+            result = pool.run(code.format(path=path))
+            if secret in result.get("stdout", ""):
+                escaped[name] = result
+        return escaped
+    finally:
+        os.remove(path)
+
+
+def benchmark(pool, submissions=200):
+    """Times sequential and concurrent script runs; returns latency figures in ms"""
+    code = "n = int(input())\nprint(sum(i * i for i in range(n)))"
+    pool.warm()
+    latencies = []
+    for index in range(submissions // 4):
+        started = time.perf_counter()
+        pool.run(code, str(index))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool.size * 2) as executor:
+        list(executor.map(lambda index: pool.run(code, str(index)), range(submissions)))
+    burst = (time.perf_counter() - started) * 1000
+    return {"median": latencies[len(latencies) // 2], "p95": latencies[int(len(latencies) * 0.95)],
+            "burst": burst, "submissions": submissions}
+
+
+def main(argv=None):
+    """Command line entry point: python sandbox.py worker|once|bench|check"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "bench"
+    if command == "worker":
+        serve(int(argv[1]) if len(argv) > 1 else None)
+    elif command == "once":
+        job = json.loads(sys.stdin.read())
+        stdout = sys.stdout
+        if REQUIRE_ISOLATION:
+            result = {"status": "unavailable", "stdout": "", "error": "Code can't be run here: the sandbox needs os.fork"}
+        else:
+            _apply_limits(job, os.getcwd())
+            result = execute(job)
+        stdout.write(json.dumps(result))
+    elif command == "bench":
+        pool = SandboxPool()
+        try:
+            result = benchmark(pool)
+        finally:
+            pool.close()
+        print(f"{pool.size} workers: median {result['median']:.1f} ms, p95 {result['p95']:.1f} ms per submission, "
+              f"{result['submissions']} concurrent submissions in {result['burst']:.0f} ms")
+    elif command == "check":
+        pool = SandboxPool(1)
+        try:
+            escaped = check_escapes(pool)
+        finally:
+            pool.close()
+        for name, result in escaped.items():
+            print(f"{name}: escaped the sandbox ({result.get('isolation')})", file=sys.stderr)
+        if escaped:
+            return 1
+        print(f"{len(ESCAPES)} escape attempts, all contained")
+    else:
+        print(main.__doc__, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
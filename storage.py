@@ -0,0 +1,984 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import random
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# SQLite store for learner progress. Each user/subject pair is one row,
+# completed nodes and achievements included, so answering a question only
+# touches the row of the learner who answered it.
+DATA_DIR = "user_data"
+DB_PATH = os.path.join(DATA_DIR, "oz_academy.db")
+LEGACY_PROGRESS_PATH = os.path.join(DATA_DIR, "progress.json")
+LEGACY_USERS_PATH = os.path.join(DATA_DIR, "users.json")
+
+# Credential rows never change once written, so recent lookups are served
+# from an in-process LRU without going back to the database
+USER_CACHE_SIZE = 10000
+
+# Progress rows carry a version number. Updates are compare-and-swap on that
+# version and retried on conflict, so concurrent sessions never lose each
+# other's changes and readers never take the write lock.
+MAX_UPDATE_ATTEMPTS = 50
+
+# Write-behind: submitted changes are applied to an in-memory copy at once and
+# persisted by a background thread, so nobody waits on disk before seeing
+# their feedback. This is also the most a crash can lose; a clean shutdown
+# always flushes.
+FLUSH_INTERVAL_SECONDS = 0.5
+# A change whose replay keeps raising something other than a database error
+# (a bug, not contention) is logged and dropped after this many flushes, so
+# it cannot hold up the user's later changes forever
+MAX_FLUSH_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+# Every change is appended to the WAL and to the progress_events audit table.
+# Answer-path connections never checkpoint; a background compactor folds the
+# WAL back into the database file once it grows past this size.
+WAL_COMPACT_BYTES = 4 * 1024 * 1024
+COMPACT_INTERVAL_SECONDS = 5
+
+# Completed nodes and achievements are stored as integer bitsets in the
+# progress row. Each name gets a bit the first time anyone earns it, recorded
+# per subject in bit_names, so bits stay stable when the curriculum changes.
+# Record field -> (bit_names kind, progress column)
+BIT_FIELDS = {
+    "completed_nodes": ("node", "completed_bits", "completed_order"),
+    "achievements": ("achievement", "achievement_bits", "achievement_order"),
+}
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    [
+        """
+        CREATE TABLE progress (
+            username TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            xp INTEGER NOT NULL DEFAULT 0,
+            level INTEGER NOT NULL DEFAULT 0,
+            hearts INTEGER NOT NULL DEFAULT 5,
+            current_node TEXT NOT NULL DEFAULT 'node1',
+            test_taken INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, subject)
+        )
+        """,
+        """
+        CREATE TABLE completed_nodes (
+            username TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            node_id TEXT NOT NULL,
+            UNIQUE (username, subject, node_id)
+        )
+        """,
+        """
+        CREATE TABLE achievements (
+            username TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            achievement TEXT NOT NULL,
+            UNIQUE (username, subject, achievement)
+        )
+        """,
+        """
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ],
+    [
+        """
+        CREATE TABLE progress_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX progress_events_user ON progress_events (username, subject, id)",
+    ],
+    [
+        """
+        CREATE TABLE users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            email TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+    ],
+    [
+        "ALTER TABLE progress ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    ],
+    [
+        """
+        CREATE TABLE bit_names (
+            kind TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            name TEXT NOT NULL,
+            bit INTEGER NOT NULL,
+            PRIMARY KEY (kind, subject, name),
+            UNIQUE (kind, subject, bit)
+        )
+        """,
+        "ALTER TABLE progress ADD COLUMN completed_bits BLOB NOT NULL DEFAULT x''",
+        "ALTER TABLE progress ADD COLUMN achievement_bits BLOB NOT NULL DEFAULT x''",
+        # The record's own item order as 32-bit bit numbers; empty when it is
+        # ascending bit order, which is the common case
+        "ALTER TABLE progress ADD COLUMN completed_order BLOB NOT NULL DEFAULT x''",
+        "ALTER TABLE progress ADD COLUMN achievement_order BLOB NOT NULL DEFAULT x''",
+        # Python step: fold the one-row-per-item tables into the new columns
+        lambda conn: _convert_child_rows(conn),
+        "DROP TABLE completed_nodes",
+        "DROP TABLE achievements",
+    ],
+]
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class VersionConflict(Exception):
+    """Raised when a progress record changed since it was read"""
+
+
+class BitNames:
+    """Name <-> bit assignments of one kind and subject, as last read from the database"""
+
+    def __init__(self, kind, subject):
+        self.kind = kind
+        self.subject = subject
+        self.bits = {}
+        self.names = {}
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def reload(self, conn):
+        rows = conn.execute(
+            "SELECT name, bit FROM bit_names WHERE kind = ? AND subject = ?", (self.kind, self.subject)
+        ).fetchall()
+        with self._lock:
+            # Swap whole dicts so readers never see a half-built table
+            self.bits = {name: bit for name, bit in rows}
+            self.names = {bit: name for name, bit in rows}
+            self.size = max(self.names, default=-1) + 1
+
+
+def _set_bits(mask):
+    """Yields the numbers of the set bits of mask, lowest first"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class BitSet:
+    """Completed nodes or achievements of one record, held as an integer bitmask.
+
+    Behaves like the list it replaces (in, append, len, iteration in the
+    order items were added), but membership is a dict lookup and a bit test.
+    Bits are numbered per subject, so the record keeps its own order of
+    bits unless it is simply ascending. Names that have no bit yet are kept
+    aside until the record is written.
+    """
+
+    __slots__ = ("registry", "mask", "extra", "order")
+
+    def __init__(self, registry, mask=0, extra=(), order=None):
+        self.registry = registry
+        self.mask = mask
+        self.extra = list(extra)
+        # Bit numbers in record order, or None while that is ascending order
+        self.order = None if order is None else list(order)
+
+    def __contains__(self, name):
+        bit = self.registry.bits.get(name)
+        if bit is not None and self.mask >> bit & 1:
+            return True
+        return name in self.extra
+
+    def append(self, name):
+        if name in self:
+            return
+        bit = self.registry.bits.get(name)
+        # Once a name is waiting for a bit, later ones queue behind it to keep their order
+        if bit is None or self.extra:
+            self.extra.append(name)
+            return
+        if self.order is None and self.mask >> bit:
+            self.order = list(_set_bits(self.mask))
+        self.mask |= 1 << bit
+        if self.order is not None:
+            self.order.append(bit)
+
+    def __iter__(self):
+        names = self.registry.names
+        for bit in _set_bits(self.mask) if self.order is None else self.order:
+            yield names[bit]
+        yield from self.extra
+
+    def __len__(self):
+        return bin(self.mask).count("1") + len(self.extra)
+
+    def __eq__(self, other):
+        if isinstance(other, (BitSet, list, tuple, set)):
+            return set(self) == set(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"BitSet({list(self)!r})"
+
+    def __copy__(self):
+        return BitSet(self.registry, self.mask, self.extra, self.order)
+
+    def __deepcopy__(self, memo):
+        # The registry is shared, only the bits belong to the record
+        return BitSet(self.registry, self.mask, self.extra, self.order)
+
+
+_local = threading.local()
+_user_cache = LRUCache(USER_CACHE_SIZE)
+_update_stats = {"conflicts": 0}
+_compactor = None
+_compactor_lock = threading.Lock()
+_registries = {}
+_registries_lock = threading.Lock()
+# Database paths this process has already migrated and imported legacy files into
+_prepared = set()
+_prepared_lock = threading.Lock()
+
+
+def get_connection():
+    """Returns this thread's connection, creating and migrating the database on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly with BEGIN
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA wal_autocheckpoint=0")
+        conn.execute(f"PRAGMA journal_size_limit={WAL_COMPACT_BYTES}")
+        _prepare(conn)
+        _local.conn = conn
+        start_compactor()
+    return conn
+
+
+@contextmanager
+def read_snapshot(conn=None):
+    """Runs the block in a read transaction so several SELECTs see one consistent state"""
+    if conn is None:
+        conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("COMMIT")
+
+
+@contextmanager
+def transaction(conn=None):
+    """Runs the block in a write transaction, rolling back on any exception"""
+    if conn is None:
+        conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def _prepare(conn):
+    """Migrates the database and runs the legacy imports, once per process.
+
+    Streamlit reruns land on new threads, each with a new connection, so
+    only the first one in a process checks; and it only takes the write
+    lock if something is left to do.
+    """
+    if DB_PATH in _prepared:
+        return
+    with _prepared_lock:
+        if DB_PATH in _prepared:
+            return
+        # WAL mode is stored in the database file, so one connection per process sets it
+        conn.execute("PRAGMA journal_mode=WAL")
+        if _setup_pending(conn):
+            _apply_migrations(conn)
+            _import_legacy_progress(conn)
+            _import_legacy_users(conn)
+        _prepared.add(DB_PATH)
+
+
+def _setup_pending(conn):
+    """Reads, outside any write transaction, whether migrations or legacy imports are still to run"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] < len(MIGRATIONS):
+        return True
+    done = conn.execute(
+        "SELECT COUNT(*) FROM meta WHERE key IN ('legacy_progress_imported', 'legacy_users_imported')"
+    ).fetchone()[0]
+    return done < 2
+
+
+def _apply_migrations(conn):
+    with transaction(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+
+def _import_legacy_progress(conn, path=LEGACY_PROGRESS_PATH):
+    """One-shot import of the old single-file progress.json"""
+    with transaction(conn):
+        done = conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_progress_imported'").fetchone()
+        if done:
+            return
+        _import_progress_file(conn, path, replace=False)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_progress_imported', ?)", (path,))
+
+
+def _import_legacy_users(conn, path=LEGACY_USERS_PATH):
+    """One-shot import of the old users.json credential file"""
+    with transaction(conn):
+        done = conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_users_imported'").fetchone()
+        if done:
+            return
+        users = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "r") as file:
+                users = json.load(file)
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password, email, created_at) VALUES (?, ?, ?, ?)",
+            [(username, user["password"], user["email"], user["created_at"]) for username, user in users.items()],
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_users_imported', ?)", (path,))
+
+
+def _import_progress_file(conn, path, replace):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, "r") as file:
+        progress = json.load(file)
+    for username, subjects in progress.items():
+        for subject, record in subjects.items():
+            _insert_subject(conn, username, subject, record, replace=replace)
+    return len(progress)
+
+
+def import_progress_json(path, replace=False):
+    """Imports a progress.json-style file; existing records are kept unless replace is set"""
+    with transaction() as conn:
+        return _import_progress_file(conn, path, replace)
+
+
+def export_progress_json(path, usernames=None):
+    """Writes progress back out in the old single-file layout, one user at a time"""
+    conn = get_connection()
+    if usernames is None:
+        usernames = [row[0] for row in conn.execute("SELECT DISTINCT username FROM progress ORDER BY username")]
+    count = 0
+    with open(path + ".tmp", "w") as file:
+        file.write("{")
+        for username in usernames:
+            with read_snapshot(conn):
+                records = _read_subjects(conn, username)
+            if not records:
+                continue
+            for record in records.values():
+                del record["version"]
+                for field in BIT_FIELDS:
+                    record[field] = list(record[field])
+            if count:
+                file.write(", ")
+            file.write(f"{json.dumps(username)}: {json.dumps(records)}")
+            count += 1
+        file.write("}")
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def _insert_subject(conn, username, subject, record, replace=True):
+    # A reset still bumps the version, so writers holding the old record conflict
+    on_conflict = (
+        "DO UPDATE SET xp = excluded.xp, level = excluded.level, hearts = excluded.hearts, "
+        "current_node = excluded.current_node, test_taken = excluded.test_taken, "
+        "completed_bits = excluded.completed_bits, completed_order = excluded.completed_order, "
+        "achievement_bits = excluded.achievement_bits, achievement_order = excluded.achievement_order, "
+        "version = version + 1"
+        if replace else "DO NOTHING"
+    )
+    conn.execute(
+        "INSERT INTO progress (username, subject, xp, level, hearts, current_node, test_taken, "
+        "completed_bits, completed_order, achievement_bits, achievement_order) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        f"ON CONFLICT (username, subject) {on_conflict}",
+        (username, subject, record["xp"], record["level"], record["hearts"],
+         record["current_node"], int(record["test_taken"]),
+         *_encode_bits(conn, "completed_nodes", subject, record["completed_nodes"]),
+         *_encode_bits(conn, "achievements", subject, record["achievements"])),
+    )
+
+
+def _registry(kind, subject):
+    key = (DB_PATH, kind, subject)
+    try:
+        return _registries[key]
+    except KeyError:
+        pass
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = BitNames(kind, subject)
+        return _registries[key]
+
+
+def _assign_bit(conn, kind, subject, name):
+    # Called inside the write transaction, so the next free bit cannot race.
+    # The in-memory registry only learns about it from a later read, which
+    # keeps rolled-back assignments out of it.
+    row = conn.execute(
+        "SELECT bit FROM bit_names WHERE kind = ? AND subject = ? AND name = ?", (kind, subject, name)
+    ).fetchone()
+    if row is not None:
+        return row[0]
+    bit = conn.execute(
+        "SELECT COALESCE(MAX(bit) + 1, 0) FROM bit_names WHERE kind = ? AND subject = ?", (kind, subject)
+    ).fetchone()[0]
+    conn.execute("INSERT INTO bit_names (kind, subject, name, bit) VALUES (?, ?, ?, ?)", (kind, subject, name, bit))
+    return bit
+
+
+def _encode_bits(conn, field, subject, names):
+    """Returns (mask, order) blobs for a record's items; order is empty when it is ascending bit order"""
+    kind = BIT_FIELDS[field][0]
+    registry = _registry(kind, subject)
+    mask = 0
+    order = None
+    if isinstance(names, BitSet) and names.registry is registry:
+        mask, order, names = names.mask, None if names.order is None else list(names.order), names.extra
+    for name in names:
+        bit = registry.bits.get(name)
+        if bit is None:
+            bit = _assign_bit(conn, kind, subject, name)
+        if mask >> bit & 1:
+            continue
+        if order is None and mask >> bit:
+            order = list(_set_bits(mask))
+        mask |= 1 << bit
+        if order is not None:
+            order.append(bit)
+    order_blob = b"" if order is None else struct.pack(f"<{len(order)}I", *order)
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little"), order_blob
+
+
+def _decode_bits(conn, field, subject, blob, order_blob):
+    registry = _registry(BIT_FIELDS[field][0], subject)
+    mask = int.from_bytes(blob, "little")
+    if mask >> registry.size:
+        # Someone assigned bits we have not seen yet
+        registry.reload(conn)
+    order = struct.unpack(f"<{len(order_blob) // 4}I", order_blob) if order_blob else None
+    return BitSet(registry, mask, order=order)
+
+
+def _convert_child_rows(conn):
+    """Folds the completed_nodes and achievements tables into bitset columns.
+
+    Each record keeps the order its rows were inserted in, so iterating a
+    converted record gives the same order the old list had.
+    """
+    for field, column in (("completed_nodes", "node_id"), ("achievements", "achievement")):
+        _, bits_column, order_column = BIT_FIELDS[field]
+        items = {}
+        for username, subject, name in conn.execute(f"SELECT username, subject, {column} FROM {field} ORDER BY rowid").fetchall():
+            items.setdefault((username, subject), []).append(name)
+        conn.executemany(
+            f"UPDATE progress SET {bits_column} = ?, {order_column} = ? WHERE username = ? AND subject = ?",
+            [_encode_bits(conn, field, subject, names) + (username, subject)
+             for (username, subject), names in items.items()],
+        )
+
+
+def _read_subjects(conn, username, subject=None):
+    query = ("SELECT subject, xp, level, hearts, current_node, test_taken, version, completed_bits, "
+             "achievement_bits, completed_order, achievement_order FROM progress WHERE username = ?")
+    params = [username]
+    if subject is not None:
+        query += " AND subject = ?"
+        params.append(subject)
+    records = {}
+    for row in conn.execute(query, params):
+        records[row[0]] = {
+            "xp": row[1],
+            "level": row[2],
+            "completed_nodes": _decode_bits(conn, "completed_nodes", row[0], row[7], row[9]),
+            "hearts": row[3],
+            "current_node": row[4],
+            "test_taken": bool(row[5]),
+            "achievements": _decode_bits(conn, "achievements", row[0], row[8], row[10]),
+            "version": row[6],
+        }
+    return records
+
+
+def load_user_progress(username):
+    """Returns {subject: record} for one user, or None if the user has no progress"""
+    with read_snapshot() as conn:
+        records = _read_subjects(conn, username)
+    write_behind.overlay(username, records)
+    return records or None
+
+
+def load_subject_progress(username, subject):
+    """Returns the progress record for one user and subject, or None"""
+    records = {}
+    record = _load_stored_subject(username, subject)
+    if record is not None:
+        records[subject] = record
+    write_behind.overlay(username, records)
+    return records.get(subject)
+
+
+def _load_stored_subject(username, subject):
+    """Reads what is on disk, ignoring changes still waiting in the write-behind queue"""
+    with read_snapshot() as conn:
+        return _read_subjects(conn, username, subject).get(subject)
+
+
+def save_subject_progress(username, subject, record, events=()):
+    """Writes one subject record back and appends its (field, value) events to the audit log.
+
+    The write only succeeds if the stored version still matches
+    record["version"]; otherwise VersionConflict is raised.
+    """
+    with transaction() as conn:
+        _write_subject(conn, username, subject, record, events)
+
+
+def _write_subject(conn, username, subject, record, events):
+    cursor = conn.execute(
+        "UPDATE progress SET xp = ?, level = ?, hearts = ?, current_node = ?, test_taken = ?, "
+        "completed_bits = ?, completed_order = ?, achievement_bits = ?, achievement_order = ?, "
+        "version = version + 1 WHERE username = ? AND subject = ? AND version = ?",
+        (record["xp"], record["level"], record["hearts"], record["current_node"],
+         int(record["test_taken"]),
+         *_encode_bits(conn, "completed_nodes", subject, record["completed_nodes"]),
+         *_encode_bits(conn, "achievements", subject, record["achievements"]),
+         username, subject, record["version"]),
+    )
+    if cursor.rowcount != 1:
+        raise VersionConflict(f"{username}/{subject} changed since version {record['version']}")
+    record["version"] += 1
+    _append_events(conn, username, subject, events)
+
+
+def _append_events(conn, username, subject, events):
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO progress_events (username, subject, field, value, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(username, subject, field, json.dumps(value), now) for field, value in events],
+    )
+
+
+def get_progress_events(username, subject=None, limit=100):
+    """Returns the most recent audit events for a user, newest first"""
+    query = "SELECT subject, field, value, created_at FROM progress_events WHERE username = ?"
+    params = [username]
+    if subject is not None:
+        query += " AND subject = ?"
+        params.append(subject)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    return [
+        {"subject": row[0], "field": row[1], "value": json.loads(row[2]), "created_at": row[3]}
+        for row in get_connection().execute(query, params)
+    ]
+
+
+def update_subject_progress(username, subject, mutate, events=()):
+    """Optimistic read-modify-write of one subject record.
+
+    mutate(record) changes the record in place. The record is read without
+    locking and written back with a compare-and-swap on its version; if
+    another writer got there first, it is re-read and mutate is applied
+    again. Returns the updated record, or None if the user has no progress
+    for the subject.
+    """
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        record = _load_stored_subject(username, subject)
+        if record is None:
+            return None
+        mutate(record)
+        try:
+            save_subject_progress(username, subject, record, events)
+            return record
+        except VersionConflict:
+            _update_stats["conflicts"] += 1
+            # Back off a little so the writers we collided with can finish
+            time.sleep(random.uniform(0, 0.001 * (attempt + 1)))
+    raise VersionConflict(f"{username}/{subject} still conflicting after {MAX_UPDATE_ATTEMPTS} attempts")
+
+
+def create_user_progress(username, records):
+    """Creates (or resets) all subject records for a user"""
+    # Queued changes belong to the progress being replaced
+    write_behind.discard(username)
+    with transaction() as conn:
+        for subject, record in records.items():
+            _insert_subject(conn, username, subject, record)
+
+
+def get_user(username):
+    """Returns the credential record for a username, or None if it does not exist"""
+    user = _user_cache.get(username)
+    if user is None:
+        row = get_connection().execute(
+            "SELECT password, email, created_at FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            # Misses are not cached: the name may be registered a moment later
+            return None
+        user = {"password": row[0], "email": row[1], "created_at": row[2]}
+        _user_cache.put(username, user)
+    return user
+
+
+def create_user(username, password_hash, email, created_at):
+    """Inserts a user unless the name is taken; returns False if it already existed"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO users (username, password, email, created_at) VALUES (?, ?, ?, ?)",
+            (username, password_hash, email, created_at),
+        )
+        return cursor.rowcount == 1
+
+
+class WriteBehindCache:
+    """Applies progress changes in memory at once and writes them from a background thread.
+
+    Changes to the same user and subject that arrive within one flush window
+    are coalesced into a single compare-and-swap update.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        # (username, subject) -> {"record", "mutations", "events"}
+        self._pending = {}
+        self._inflight = {}
+        self._stats = {
+            "flushes": 0,
+            "records_written": 0,
+            "changes_written": 0,
+            "failed_writes": 0,
+            "dropped_writes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def submit(self, username, subject, mutate, events=()):
+        """Applies mutate to the cached record now and queues it for writing.
+
+        Returns a copy of the updated record, or None if the user has no
+        progress for the subject.
+        """
+        key = (username, subject)
+        loaded = None
+        while True:
+            with self._lock:
+                entry = self._pending.get(key)
+                if entry is None:
+                    # Build on the record being written right now, if any, so
+                    # its changes do not vanish from reads until it lands
+                    inflight = self._inflight.get(key)
+                    if inflight is not None:
+                        loaded = copy.deepcopy(inflight["record"])
+                    if loaded is not None:
+                        entry = self._pending[key] = {"record": loaded, "mutations": [], "events": []}
+                if entry is not None:
+                    mutate(entry["record"])
+                    entry["mutations"].append(mutate)
+                    entry["events"].extend(events)
+                    record = copy.deepcopy(entry["record"])
+                    break
+            loaded = _load_stored_subject(username, subject)
+            if loaded is None:
+                return None
+        self._ensure_thread()
+        return record
+
+    def overlay(self, username, records):
+        """Replaces stored records with their cached versions where changes are still queued"""
+        with self._lock:
+            if not self._pending and not self._inflight:
+                return
+            for subject in list(records):
+                entry = self._pending.get((username, subject)) or self._inflight.get((username, subject))
+                if entry is not None:
+                    records[subject] = copy.deepcopy(entry["record"])
+
+    def discard(self, username):
+        """Drops queued changes for a user whose progress is being reset"""
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == username]:
+                del self._pending[key]
+
+    def flush(self):
+        """Writes everything queued so far; returns the number of records written"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+                self._inflight = batch
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            written = 0
+            changes = 0
+            dropped = 0
+            failed = {}
+            done = set()
+            try:
+                for (username, subject), entry in batch.items():
+                    def replay(record, mutations=entry["mutations"]):
+                        for mutate in mutations:
+                            mutate(record)
+                    try:
+                        update_subject_progress(username, subject, replay, entry["events"])
+                        written += 1
+                        changes += len(entry["mutations"])
+                    except (sqlite3.Error, VersionConflict):
+                        failed[(username, subject)] = entry
+                    except Exception:
+                        entry["attempts"] = entry.get("attempts", 0) + 1
+                        if entry["attempts"] >= MAX_FLUSH_ATTEMPTS:
+                            logger.exception("Dropping %d queued progress changes for %s/%s",
+                                             len(entry["mutations"]), username, subject)
+                            dropped += 1
+                        else:
+                            logger.warning("Writing progress for %s/%s failed, will retry", username, subject,
+                                           exc_info=True)
+                            failed[(username, subject)] = entry
+                    done.add((username, subject))
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    # Anything that could not be written, or was not reached
+                    # because the flush was interrupted, goes back in front of
+                    # newer changes
+                    for key, entry in batch.items():
+                        if key in done and key not in failed:
+                            continue
+                        newer = self._pending.get(key)
+                        if newer is not None:
+                            entry["record"] = newer["record"]
+                            entry["mutations"] += newer["mutations"]
+                            entry["events"] += newer["events"]
+                        self._pending[key] = entry
+                    self._inflight = {}
+                    self._stats["flushes"] += 1
+                    self._stats["records_written"] += written
+                    self._stats["changes_written"] += changes
+                    self._stats["failed_writes"] += len(failed)
+                    self._stats["dropped_writes"] += dropped
+                    self._stats["last_flush_ms"] = elapsed_ms
+                    self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+                    self._stats["total_flush_ms"] += elapsed_ms
+            return written
+
+    def stats(self):
+        """Returns queue depth and flush latency metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+            stats["queued_changes"] = sum(len(entry["mutations"]) for entry in self._pending.values())
+            stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+            # Changes that reached disk in the same transaction as an earlier one
+            stats["coalesced"] = stats["changes_written"] - stats["records_written"]
+        return stats
+
+    def close(self):
+        """Stops the writer thread after a final flush"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _ensure_thread(self):
+        with self._lock:
+            # Also restarts a writer that died, so queued changes still reach disk
+            if (self._thread is None or not self._thread.is_alive()) and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Progress flush failed; retrying on the next interval")
+
+
+write_behind = WriteBehindCache(FLUSH_INTERVAL_SECONDS)
+atexit.register(write_behind.close)
+
+
+def submit_subject_progress(username, subject, mutate, events=()):
+    """Applies a change to one subject record now and persists it in the background"""
+    return write_behind.submit(username, subject, mutate, events)
+
+
+def compact(force=False):
+    """Checkpoints the WAL into the database file once it passes WAL_COMPACT_BYTES"""
+    wal_path = DB_PATH + "-wal"
+    if not force and (not os.path.exists(wal_path) or os.path.getsize(wal_path) < WAL_COMPACT_BYTES):
+        return False
+    # PASSIVE never waits on readers or writers; whatever it cannot fold this
+    # round is picked up next time. journal_size_limit shrinks the file once
+    # the log is reset.
+    get_connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+    return True
+
+
+def _compactor_loop():
+    while True:
+        time.sleep(COMPACT_INTERVAL_SECONDS)
+        try:
+            compact()
+        except sqlite3.Error:
+            # Busy or locked: the log keeps growing and we try again next round
+            pass
+
+
+def start_compactor():
+    """Starts the background WAL compactor once per process"""
+    global _compactor
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = threading.Thread(target=_compactor_loop, name="progress-compactor", daemon=True)
+            _compactor.start()
+
+
+def stress_test(threads=16, increments=200, username="stress-user", subject="Mathematics"):
+    """Hammers one user's XP from many threads and checks that no increment is lost"""
+    record = {"xp": 0, "level": 0, "completed_nodes": [], "hearts": 5,
+              "current_node": "node1", "test_taken": False, "achievements": []}
+    create_user_progress(username, {subject: record})
+    conflicts_before = _update_stats["conflicts"]
+
+    def add_xp(progress):
+        progress["xp"] += 1
+
+    def worker():
+        for _ in range(increments):
+            update_subject_progress(username, subject, add_xp, [("xp", 1)])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = threads * increments
+    actual = load_subject_progress(username, subject)["xp"]
+    assert actual == expected, f"lost updates: expected xp {expected}, got {actual}"
+    return {
+        "updates": expected,
+        "seconds": elapsed,
+        "updates_per_second": expected / elapsed,
+        "conflicts": _update_stats["conflicts"] - conflicts_before,
+    }
+
+
+def main(argv=None):
+    """Command line entry point: python storage.py import|export|stress"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move learner progress between SQLite and progress.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="load a progress.json-style file into the database")
+    import_parser.add_argument("path", nargs="?", default=LEGACY_PROGRESS_PATH)
+    import_parser.add_argument("--replace", action="store_true", help="overwrite users that already exist")
+    export_parser = commands.add_parser("export", help="write the database out as a progress.json-style file")
+    export_parser.add_argument("path", nargs="?", default=LEGACY_PROGRESS_PATH)
+    export_parser.add_argument("--user", action="append", dest="usernames", help="only export these users")
+    stress_parser = commands.add_parser("stress", help="check concurrent updates on a scratch database")
+    stress_parser.add_argument("--threads", type=int, default=16)
+    stress_parser.add_argument("--increments", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.command == "stress":
+        import tempfile
+
+        global DB_PATH
+        with tempfile.TemporaryDirectory() as scratch:
+            DB_PATH = os.path.join(scratch, "stress.db")
+            result = stress_test(args.threads, args.increments)
+        print(f"{result['updates']} updates in {result['seconds']:.2f}s "
+              f"({result['updates_per_second']:.0f}/s), {result['conflicts']} CAS retries, none lost")
+        return
+
+    if args.command == "import":
+        count = import_progress_json(args.path, replace=args.replace)
+        print(f"Imported {count} users from {args.path}")
+    else:
+        count = export_progress_json(args.path, args.usernames)
+        print(f"Exported {count} users to {args.path}")
+
+
+if __name__ == "__main__":
+    main()